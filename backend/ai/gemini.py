@@ -1,15 +1,214 @@
-import logging
 import asyncio
-from typing import Optional
+import hashlib
+import logging
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import AsyncIterator, Optional
 import google.generativeai as genai
 
-from config import GEMINI_API_KEY
+from config import GEMINI_API_KEY, LLM_CACHE_SIZE, LLM_CACHE_TTL, LLM_CACHE_DB
 from ai.prompts import ANSWER_QUESTION, EXPLAIN_CODE, SUMMARIZE_CODEBASE
+from ai.retrieval import retrieve_context
+from content.store import content_store
 from graph.neo4j_client import Neo4jClient
-from graph.queries import get_node_by_id
+from graph.queries import build_codebase_context, get_node_by_id
 
 logger = logging.getLogger(__name__)
 
+MODEL_NAME = "gemini-2.0-flash"
+
+# Bounded so a reference has a longest possible length, which caps what streaming keeps
+REFERENCE_PATH_MAX = 300
+REFERENCE_PATTERN = re.compile(r'\[([^:]{1,%d}):(\d{1,9})-(\d{1,9})\]' % REFERENCE_PATH_MAX)
+REFERENCE_MAX_LENGTH = REFERENCE_PATH_MAX + 22
+
+
+def _reference(match: re.Match) -> dict:
+    return {
+        "file": match.group(1),
+        "start_line": int(match.group(2)),
+        "end_line": int(match.group(3))
+    }
+
+
+class ReferenceScanner:
+    """Picks [file:start-end] references out of streamed text as soon as each is complete.
+
+    Only the text after the last complete reference is kept, and of that no more than
+    a reference could span, so a reference split across chunks is found once its
+    closing bracket arrives and a long answer without references is scanned in
+    linear time.
+    """
+
+    def __init__(self):
+        self.references: list[dict] = []
+        self._pending = ""
+
+    def feed(self, text: str) -> list[dict]:
+        self._pending += text
+        found = []
+        end = 0
+        for match in REFERENCE_PATTERN.finditer(self._pending):
+            found.append(_reference(match))
+            end = match.end()
+        self._pending = self._pending[end:][-(REFERENCE_MAX_LENGTH - 1):]
+        self.references.extend(found)
+        return found
+
+
+class GenerationMetrics:
+    """Latency of Gemini calls. Time to first token is what a user waits before text
+    appears; for a non-streamed call it is the whole generation."""
+
+    def __init__(self):
+        self.requests = 0
+        self.streamed = 0
+        self.errors = 0
+        self.first_token_total = 0.0
+        self.first_token_max = 0.0
+        self.duration_total = 0.0
+
+    def record(self, first_token: float, duration: float, streamed: bool):
+        self.requests += 1
+        self.streamed += streamed
+        self.first_token_total += first_token
+        self.first_token_max = max(self.first_token_max, first_token)
+        self.duration_total += duration
+
+    def _average_ms(self, total: float) -> float:
+        return round(1000 * total / self.requests, 1) if self.requests else 0.0
+
+    def to_dict(self) -> dict:
+        return {
+            "requests": self.requests,
+            "streamed": self.streamed,
+            "errors": self.errors,
+            "first_token_avg_ms": self._average_ms(self.first_token_total),
+            "first_token_max_ms": round(1000 * self.first_token_max, 1),
+            "duration_avg_ms": self._average_ms(self.duration_total),
+        }
+
+
+class ResponseCache:
+    """Generated responses keyed by prompt template, model and the repo's content hash.
+
+    A size-bounded in-memory LRU sits in front of an optional SQLite tier that
+    survives restarts. Entries expire after ttl seconds, and re-analyzing a repo
+    drops all of its entries. Each entry remembers how long it took to generate,
+    which is the latency a hit saves.
+    """
+
+    def __init__(self, max_size: int, ttl: int, db_path: str = ""):
+        self._entries: OrderedDict[str, tuple[str, str, float, float]] = OrderedDict()
+        self._max_size = max_size
+        self._ttl = ttl
+        self._db = None
+        self._db_lock = threading.Lock()
+        if db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.executescript("""
+                CREATE TABLE IF NOT EXISTS llm_responses (
+                    key TEXT PRIMARY KEY, repo_id TEXT, response TEXT, expires_at REAL, cost REAL
+                );
+                CREATE INDEX IF NOT EXISTS llm_responses_repo ON llm_responses (repo_id);
+                CREATE INDEX IF NOT EXISTS llm_responses_expiry ON llm_responses (expires_at);
+            """)
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.saved_seconds = 0.0
+
+    @staticmethod
+    def make_key(template: str, model: str, content_hash: str, prompt: str) -> str:
+        digest = hashlib.sha256()
+        for part in (template, model, content_hash, prompt):
+            digest.update(part.encode())
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+    async def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        entry = self._entries.get(key)
+        if entry is not None and entry[2] > now:
+            self._entries.move_to_end(key)
+            self.memory_hits += 1
+            self.saved_seconds += entry[3]
+            return entry[1]
+        if entry is not None:
+            del self._entries[key]
+        
+        if self._db is not None:
+            entry = await asyncio.to_thread(self._db_get, key, now)
+            if entry is not None:
+                self._remember(key, entry)
+                self.disk_hits += 1
+                self.saved_seconds += entry[3]
+                return entry[1]
+        
+        self.misses += 1
+        return None
+
+    async def put(self, key: str, repo_id: str, response: str, cost: float):
+        entry = (repo_id, response, time.time() + self._ttl, cost)
+        self._remember(key, entry)
+        if self._db is not None:
+            await asyncio.to_thread(self._db_put, key, entry)
+
+    async def invalidate_repo(self, repo_id: str):
+        for key in [key for key, entry in self._entries.items() if entry[0] == repo_id]:
+            del self._entries[key]
+        if self._db is not None:
+            await asyncio.to_thread(self._db_execute, "DELETE FROM llm_responses WHERE repo_id = ?", (repo_id,))
+
+    def _remember(self, key: str, entry: tuple):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self._max_size:
+            self._entries.popitem(last=False)
+
+    def _db_execute(self, statement: str, parameters: tuple):
+        with self._db_lock, self._db:
+            self._db.execute(statement, parameters)
+
+    def _db_get(self, key: str, now: float) -> Optional[tuple]:
+        with self._db_lock:
+            return self._db.execute(
+                "SELECT repo_id, response, expires_at, cost FROM llm_responses WHERE key = ? AND expires_at > ?",
+                (key, now)
+            ).fetchone()
+
+    def _db_put(self, key: str, entry: tuple):
+        with self._db_lock, self._db:
+            self._db.execute("DELETE FROM llm_responses WHERE expires_at <= ?", (time.time(),))
+            self._db.execute("INSERT OR REPLACE INTO llm_responses VALUES (?, ?, ?, ?, ?)", (key, *entry))
+
+    def to_dict(self) -> dict:
+        hits = self.memory_hits + self.disk_hits
+        lookups = hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": hits,
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": round(hits / lookups, 3) if lookups else 0.0,
+            "saved_ms": round(1000 * self.saved_seconds, 1),
+        }
+
+
+response_cache = ResponseCache(LLM_CACHE_SIZE, LLM_CACHE_TTL, LLM_CACHE_DB)
+
+
+def _chunk_text(chunk) -> str:
+    # Chunks without text parts (e.g. a trailing finish/safety chunk) raise on .text
+    try:
+        return chunk.text
+    except ValueError:
+        return ""
+
 
 class GeminiClient:
     _instance: Optional["GeminiClient"] = None
@@ -25,87 +224,142 @@ class GeminiClient:
         if not GEMINI_API_KEY:
             raise ValueError("GEMINI_API_KEY must be set")
         genai.configure(api_key=GEMINI_API_KEY)
-        self._model = genai.GenerativeModel("gemini-2.0-flash")
+        self._model = genai.GenerativeModel(MODEL_NAME)
+        self.metrics = GenerationMetrics()
         logger.info("Gemini client initialized")
 
     async def generate(self, prompt: str) -> str:
+        # Native async call: waiting on Gemini doesn't tie up an executor thread
+        start = time.perf_counter()
         try:
-            loop = asyncio.get_event_loop()
-            response = await loop.run_in_executor(
-                None,
-                self._model.generate_content,
-                prompt
-            )
-            return response.text
+            response = await self._model.generate_content_async(prompt)
+            text = response.text
         except Exception as e:
+            self.metrics.errors += 1
             logger.error(f"Gemini generation failed: {e}")
             raise
+        duration = time.perf_counter() - start
+        self.metrics.record(duration, duration, streamed=False)
+        return text
 
-    async def get_codebase_context(self, neo4j: Neo4jClient, repo_id: str) -> str:
+    async def generate_stream(self, prompt: str) -> AsyncIterator[str]:
+        """Yield the response text chunk by chunk as Gemini produces it."""
+        start = time.perf_counter()
+        first_token = None
+        try:
+            response = await self._model.generate_content_async(prompt, stream=True)
+            async for chunk in response:
+                text = _chunk_text(chunk)
+                if not text:
+                    continue
+                if first_token is None:
+                    first_token = time.perf_counter() - start
+                yield text
+        except Exception as e:
+            self.metrics.errors += 1
+            logger.error(f"Gemini streaming failed: {e}")
+            raise
+        duration = time.perf_counter() - start
+        self.metrics.record(first_token if first_token is not None else duration, duration, streamed=True)
+
+    async def _cache_key(self, neo4j: Neo4jClient, repo_id: str, template: str, prompt: str) -> str:
         query = """
         MATCH (r:Repo {id: $repo_id})
-        OPTIONAL MATCH (r)-[:HAS_FILE]->(f:File)
-        OPTIONAL MATCH (f)-[:CONTAINS]->(fn:Function)
-        OPTIONAL MATCH (f)-[:CONTAINS]->(c:Class)
-        RETURN r.name as repo_name,
-               collect(DISTINCT f.path) as files,
-               collect(DISTINCT {name: fn.name, file: fn.file_path, type: 'function'}) as functions,
-               collect(DISTINCT {name: c.name, file: c.file_path, type: 'class'}) as classes
+        RETURN coalesce(r.content_hash, r.commit_sha, '') as content_hash
         """
         result = await neo4j.execute_query(query, {"repo_id": repo_id})
+        content_hash = result[0]["content_hash"] if result else ""
+        return response_cache.make_key(template, MODEL_NAME, content_hash, prompt)
+
+    async def _generate_cached(self, neo4j: Neo4jClient, repo_id: str, template: str, prompt: str) -> str:
+        key = await self._cache_key(neo4j, repo_id, template, prompt)
+        cached = await response_cache.get(key)
+        if cached is not None:
+            return cached
         
-        if not result:
-            return "No codebase information available."
-        
-        data = result[0]
-        files = [f for f in data.get("files", []) if f]
-        functions = [f for f in data.get("functions", []) if f.get("name")]
-        classes = [c for c in data.get("classes", []) if c.get("name")]
-        
-        context_parts = [
-            f"Repository: {data.get('repo_name', 'Unknown')}",
-            f"\nFiles ({len(files)}):",
-        ]
-        
-        for f in files[:50]:
-            context_parts.append(f"  - {f}")
+        start = time.perf_counter()
+        response = await self.generate(prompt)
+        await response_cache.put(key, repo_id, response, time.perf_counter() - start)
+        return response
+
+    async def _stream_cached(self, neo4j: Neo4jClient, repo_id: str, template: str,
+                             prompt: str) -> AsyncIterator[str]:
+        """Like generate_stream, but a cached response comes back as a single chunk."""
+        key = await self._cache_key(neo4j, repo_id, template, prompt)
+        cached = await response_cache.get(key)
+        if cached is not None:
+            yield cached
+            return
         
-        if functions:
-            context_parts.append(f"\nFunctions ({len(functions)}):")
-            for fn in functions[:30]:
-                context_parts.append(f"  - {fn['name']} in {fn['file']}")
+        start = time.perf_counter()
+        parts = []
+        async for text in self.generate_stream(prompt):
+            parts.append(text)
+            yield text
+        await response_cache.put(key, repo_id, "".join(parts), time.perf_counter() - start)
+
+    async def get_codebase_context(self, neo4j: Neo4jClient, repo_id: str) -> tuple[str, str]:
+        """Return the repo name and the context summary stored on it at ingestion.
+
+        Repos analyzed before the summary was stored get it built and saved on first use.
+        """
+        query = """
+        MATCH (r:Repo {id: $repo_id})
+        RETURN r.name as repo_name, r.context as context
+        """
+        result = await neo4j.execute_query(query, {"repo_id": repo_id})
         
-        if classes:
-            context_parts.append(f"\nClasses ({len(classes)}):")
-            for c in classes[:20]:
-                context_parts.append(f"  - {c['name']} in {c['file']}")
+        if not result:
+            return "Unknown", "No codebase information available."
         
-        return "\n".join(context_parts)
+        repo_name = result[0]["repo_name"] or "Unknown"
+        context = result[0]["context"]
+        if context is None:
+            context = await build_codebase_context(neo4j, repo_id)
+            await neo4j.set_repo_context(repo_id, context)
+        return repo_name, context
 
-    async def answer_question(self, repo_id: str, question: str, neo4j: Neo4jClient) -> tuple[str, list]:
-        context = await self.get_codebase_context(neo4j, repo_id)
-        
-        repo_query = "MATCH (r:Repo {id: $repo_id}) RETURN r.name as name"
-        repo_result = await neo4j.execute_query(repo_query, {"repo_id": repo_id})
-        repo_name = repo_result[0]["name"] if repo_result else "Unknown"
+    async def _answer_prompt(self, repo_id: str, question: str, neo4j: Neo4jClient) -> str:
+        repo_name, context = await self.get_codebase_context(neo4j, repo_id)
+        # The code around what the question names beats the whole-repo summary;
+        # the summary stays for questions that name nothing in the repo
+        retrieved = await retrieve_context(neo4j, repo_id, question)
+        if retrieved:
+            context = retrieved
         
-        prompt = ANSWER_QUESTION.format(
+        return ANSWER_QUESTION.format(
             repo_name=repo_name,
             context=context,
             question=question
         )
+
+    async def answer_question(self, repo_id: str, question: str, neo4j: Neo4jClient) -> tuple[str, list]:
+        prompt = await self._answer_prompt(repo_id, question, neo4j)
         
-        response = await self.generate(prompt)
+        response = await self._generate_cached(neo4j, repo_id, ANSWER_QUESTION, prompt)
         
         references = self._extract_references(response)
         
         return response, references
 
-    async def explain_node(self, repo_id: str, node_id: str, neo4j: Neo4jClient) -> tuple[str, str]:
+    async def stream_answer(self, repo_id: str, question: str, neo4j: Neo4jClient) -> AsyncIterator[dict]:
+        """Stream events for an answer: "token" chunks, each "reference" as soon as it is
+        complete, then "done" with all references."""
+        prompt = await self._answer_prompt(repo_id, question, neo4j)
+        scanner = ReferenceScanner()
+        
+        async for text in self._stream_cached(neo4j, repo_id, ANSWER_QUESTION, prompt):
+            yield {"type": "token", "text": text}
+            for reference in scanner.feed(text):
+                yield {"type": "reference", "reference": reference}
+        
+        yield {"type": "done", "references": scanner.references}
+
+    async def _explain_prompt(self, repo_id: str, node_id: str, neo4j: Neo4jClient) -> Optional[tuple[str, str]]:
         node_data = await get_node_by_id(neo4j, repo_id, node_id)
         
         if not node_data:
-            return "Node not found.", ""
+            return None
         
         node = node_data.get("n", {})
         node_type = node_data.get("type", "unknown")
@@ -113,9 +367,14 @@ class GeminiClient:
         file_path = node.get("file_path", node.get("path", ""))
         element_name = node.get("name", file_path)
         start_line = node.get("start_line", 1)
-        end_line = node.get("end_line", 1)
+        # File nodes carry no line range: read the file from the top
+        end_line = node.get("end_line")
         
-        code = f"[Code from {file_path}:{start_line}-{end_line}]"
+        code = await content_store.get_lines(repo_id, file_path, start_line, end_line)
+        if end_line is None:
+            end_line = start_line + code.count("\n") if code else start_line
+        if code is None:
+            code = f"[Code from {file_path}:{start_line}-{end_line}]"
         
         language = "python"
         if file_path.endswith((".js", ".jsx")):
@@ -133,22 +392,34 @@ class GeminiClient:
             code=code,
             context="Part of the analyzed codebase"
         )
+        return prompt, code
+
+    async def explain_node(self, repo_id: str, node_id: str, neo4j: Neo4jClient) -> tuple[str, str]:
+        built = await self._explain_prompt(repo_id, node_id, neo4j)
         
-        explanation = await self.generate(prompt)
+        if built is None:
+            return "Node not found.", ""
+        
+        prompt, code = built
+        explanation = await self._generate_cached(neo4j, repo_id, EXPLAIN_CODE, prompt)
         
         return explanation, code
 
+    async def stream_explanation(self, repo_id: str, node_id: str, neo4j: Neo4jClient) -> AsyncIterator[dict]:
+        """Stream events for an explanation: "code" first, then "token" chunks, then "done"."""
+        built = await self._explain_prompt(repo_id, node_id, neo4j)
+        
+        if built is None:
+            yield {"type": "code", "code": ""}
+            yield {"type": "token", "text": "Node not found."}
+            yield {"type": "done"}
+            return
+        
+        prompt, code = built
+        yield {"type": "code", "code": code}
+        async for text in self._stream_cached(neo4j, repo_id, EXPLAIN_CODE, prompt):
+            yield {"type": "token", "text": text}
+        yield {"type": "done"}
+
     def _extract_references(self, text: str) -> list[dict]:
-        import re
-        references = []
-        pattern = r'\[([^:]+):(\d+)-(\d+)\]'
-        matches = re.findall(pattern, text)
-        
-        for match in matches:
-            references.append({
-                "file": match[0],
-                "start_line": int(match[1]),
-                "end_line": int(match[2])
-            })
-        
-        return references
+        return [_reference(match) for match in REFERENCE_PATTERN.finditer(text)]
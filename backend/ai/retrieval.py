@@ -0,0 +1,136 @@
+import logging
+import math
+import posixpath
+from typing import Optional
+
+from config import (
+    SUPPORTED_LANGUAGES, RETRIEVAL_SEEDS, RETRIEVAL_MAX_HOPS, RETRIEVAL_FANOUT,
+    RETRIEVAL_MAX_NODES, RETRIEVAL_TOKEN_BUDGET, RETRIEVAL_SNIPPET_LINES,
+)
+from content.store import content_store
+from graph.neo4j_client import Neo4jClient
+from graph.queries import find_seed_nodes, get_neighbors
+
+logger = logging.getLogger(__name__)
+
+# Share of a node's score handed on per hop; closer to the matches ranks higher
+HOP_DECAY = 0.5
+# Modules only link the files that import them; they are walked through but never packed
+PACKED_TYPES = ("Function", "Class", "File")
+
+
+def _estimate_tokens(text: str) -> int:
+    return len(text) // 4 + 1
+
+
+def _language(path: str) -> str:
+    return SUPPORTED_LANGUAGES.get(posixpath.splitext(path)[1], "")
+
+
+async def rank_nodes(neo4j: Neo4jClient, repo_id: str, question: str) -> list[dict]:
+    """Nodes relevant to a question, best first, each with a "score".
+
+    Seeds are the symbol-index matches for the question's terms, scored by match
+    quality. A breadth-first walk of RETRIEVAL_MAX_HOPS over CALLS, IMPORTS, CONTAINS
+    and HAS_METHOD hands every reached node a decayed share of its parent's score,
+    split across the parent's neighbors the way personalized PageRank does, so hubs
+    (a module imported everywhere) don't flood the ranking. A node reached from
+    several matches collects from each. At most RETRIEVAL_MAX_NODES are visited.
+    """
+    seeds = await find_seed_nodes(neo4j, repo_id, question, RETRIEVAL_SEEDS)
+    if not seeds:
+        return []
+
+    top_score = max(seed["score"] for seed in seeds) or 1.0
+    nodes = {}
+    for seed in seeds:
+        nodes[seed["element_id"]] = {**seed, "score": seed["score"] / top_score}
+    frontier = list(nodes)
+
+    for _ in range(RETRIEVAL_MAX_HOPS):
+        if not frontier or len(nodes) >= RETRIEVAL_MAX_NODES:
+            break
+        expanding = set(frontier)
+        neighbors = {}
+        for row in await get_neighbors(neo4j, repo_id, frontier, RETRIEVAL_FANOUT):
+            neighbors.setdefault(row["source"], []).append(row)
+
+        reached = {}
+        for source, rows in neighbors.items():
+            share = nodes[source]["score"] * HOP_DECAY / math.sqrt(len(rows))
+            for row in rows:
+                element_id = row["element_id"]
+                if element_id in nodes:
+                    if element_id not in expanding:
+                        nodes[element_id]["score"] += share
+                    continue
+                node = reached.setdefault(element_id, {**row, "score": 0.0})
+                node["score"] += share
+
+        # Keep the strongest newcomers when the visit cap would be exceeded
+        room = RETRIEVAL_MAX_NODES - len(nodes)
+        frontier = sorted(reached, key=lambda element_id: reached[element_id]["score"], reverse=True)[:room]
+        for element_id in frontier:
+            nodes[element_id] = reached[element_id]
+
+    ranked = [node for node in nodes.values() if node["type"] in PACKED_TYPES]
+    ranked.sort(key=lambda node: node["score"], reverse=True)
+    return ranked
+
+
+async def _snippet(repo_id: str, node: dict) -> Optional[str]:
+    if node["type"] == "File" or not node.get("start_line"):
+        return None
+    end_line = min(node["end_line"] or node["start_line"], node["start_line"] + RETRIEVAL_SNIPPET_LINES - 1)
+    code = await content_store.get_lines(repo_id, node["file_path"], node["start_line"], end_line)
+    if code is not None and end_line < (node["end_line"] or 0):
+        code += "\n..."
+    return code
+
+
+async def retrieve_context(neo4j: Neo4jClient, repo_id: str, question: str) -> Optional[str]:
+    """Chat context for one question: the code most relevant to it, packed into
+    RETRIEVAL_TOKEN_BUDGET tokens. Returns None when nothing in the repo matches.
+
+    Functions and classes are packed with their source span, best first, skipping
+    any span already inside a packed one (a method under its class). Files are
+    listed by path. Whatever doesn't fit the budget is left out.
+    """
+    ranked = await rank_nodes(neo4j, repo_id, question)
+    if not ranked:
+        return None
+
+    budget = RETRIEVAL_TOKEN_BUDGET
+    sections = []
+    files = []
+    packed_spans = {}
+    for node in ranked:
+        if node["type"] == "File":
+            if _estimate_tokens(node["file_path"]) <= budget:
+                files.append(node["file_path"])
+                budget -= _estimate_tokens(node["file_path"])
+            continue
+
+        spans = packed_spans.setdefault(node["file_path"], [])
+        start_line, end_line = node.get("start_line") or 0, node.get("end_line") or 0
+        if any(start <= start_line and end_line <= end for start, end in spans):
+            continue
+
+        header = f"{node['type']} {node['name']} [{node['file_path']}:{start_line}-{end_line}]"
+        code = await _snippet(repo_id, node)
+        section = f"{header}\n```{_language(node['file_path'])}\n{code}\n```" if code else header
+        cost = _estimate_tokens(section)
+        if cost > budget:
+            continue
+        sections.append(section)
+        spans.append((start_line, end_line))
+        budget -= cost
+
+    parts = []
+    if sections:
+        parts.append("Relevant code (most relevant first):\n\n" + "\n\n".join(sections))
+    if files:
+        parts.append("Related files:\n" + "\n".join(f"  - {path}" for path in files))
+    logger.debug(f"Retrieved {len(sections)} code spans and {len(files)} files, "
+                 f"{RETRIEVAL_TOKEN_BUDGET - budget} of {RETRIEVAL_TOKEN_BUDGET} tokens")
+    return "\n\n".join(parts) or None
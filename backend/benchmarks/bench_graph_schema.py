@@ -0,0 +1,144 @@
+"""Ingestion and lookup latency with and without the graph schema (constraints + indexes).
+
+Needs a running Neo4j configured through the usual NEO4J_* settings. The benchmark
+drops and then re-creates the app's constraints and indexes, so point it at a
+scratch database and pass --allow-schema-drop.
+
+    python benchmarks/bench_graph_schema.py --allow-schema-drop [--nodes 1000000]
+"""
+import os
+import sys
+import time
+import random
+import asyncio
+import argparse
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from graph.neo4j_client import Neo4jClient
+from graph.schema import CONSTRAINTS, INDEXES, ensure_schema
+
+REPO_ID = "bench-schema"
+FUNCTIONS_PER_FILE = 50
+LOAD_BATCH = 10_000
+
+
+def function_rows(start: int, count: int) -> list[dict]:
+    return [
+        {
+            "file_path": f"pkg/module_{i // FUNCTIONS_PER_FILE}.py",
+            "name": f"func_{i}",
+            "start_line": 1,
+            "end_line": 10,
+            "params": "()",
+            "return_type": "",
+        }
+        for i in range(start, start + count)
+    ]
+
+
+async def drop_schema(neo4j: Neo4jClient):
+    for name in CONSTRAINTS:
+        await neo4j.execute_write(f"DROP CONSTRAINT {name} IF EXISTS")
+    for name in INDEXES:
+        await neo4j.execute_write(f"DROP INDEX {name} IF EXISTS")
+
+
+async def cleanup(neo4j: Neo4jClient):
+    await neo4j.execute_write(
+        """
+        MATCH (n) WHERE n.repo_id = $repo_id OR n.id = $repo_id
+        CALL { WITH n DETACH DELETE n } IN TRANSACTIONS OF 10000 ROWS
+        """,
+        {"repo_id": REPO_ID},
+    )
+
+
+async def load(neo4j: Neo4jClient, nodes: int):
+    """Bulk CREATE the synthetic repo; CREATE needs no lookups, so this is schema-independent."""
+    files = nodes // (FUNCTIONS_PER_FILE + 1)
+    await neo4j.execute_write("CREATE (:Repo {id: $repo_id, name: 'bench', url: 'bench'})", {"repo_id": REPO_ID})
+    await neo4j.execute_write_batches(
+        """
+        MATCH (r:Repo {id: $repo_id})
+        UNWIND $rows AS i
+        CREATE (r)-[:HAS_FILE]->(:File {repo_id: $repo_id, path: 'pkg/module_' + toString(i) + '.py', language: 'python'})
+        """,
+        list(range(files)), {"repo_id": REPO_ID}, LOAD_BATCH,
+    )
+    await neo4j.execute_write_batches(
+        """
+        UNWIND $rows AS row
+        CREATE (:Function {repo_id: $repo_id, file_path: row.file_path, name: row.name,
+                           start_line: row.start_line, end_line: row.end_line})
+        """,
+        function_rows(0, files * FUNCTIONS_PER_FILE), {"repo_id": REPO_ID}, LOAD_BATCH,
+    )
+    return files * FUNCTIONS_PER_FILE
+
+
+async def measure(neo4j: Neo4jClient, existing: int, new_offset: int, lookups: int) -> dict:
+    # New functions spread over files that already exist, like a re-analysis adding code
+    rows = function_rows(new_offset, 1000)
+    for k, row in enumerate(rows):
+        row["file_path"] = f"pkg/module_{(k * FUNCTIONS_PER_FILE) % existing // FUNCTIONS_PER_FILE}.py"
+    start = time.perf_counter()
+    await neo4j.create_function_nodes(REPO_ID, rows, batch_size=1000)
+    merge_ms = (time.perf_counter() - start) * 1000
+
+    latencies = []
+    for i in random.sample(range(existing), lookups):
+        row = function_rows(i, 1)[0]
+        start = time.perf_counter()
+        await neo4j.execute_query(
+            "MATCH (fn:Function {name: $name, file_path: $file_path, repo_id: $repo_id}) RETURN fn.start_line",
+            {"name": row["name"], "file_path": row["file_path"], "repo_id": REPO_ID},
+        )
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    await neo4j.execute_query("MATCH (f:File {repo_id: $repo_id}) RETURN count(f)", {"repo_id": REPO_ID})
+    repo_files_ms = (time.perf_counter() - start) * 1000
+
+    return {
+        "merge 1k functions": merge_ms,
+        "keyed lookup p50": statistics.median(latencies),
+        "keyed lookup p95": statistics.quantiles(latencies, n=20)[-1],
+        "files of repo": repo_files_ms,
+    }
+
+
+async def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument("--nodes", type=int, default=1_000_000)
+    arg_parser.add_argument("--lookups", type=int, default=200)
+    arg_parser.add_argument("--allow-schema-drop", action="store_true")
+    args = arg_parser.parse_args()
+    if not args.allow_schema_drop:
+        arg_parser.error("this benchmark drops the graph schema; pass --allow-schema-drop")
+
+    neo4j = Neo4jClient()
+    try:
+        await cleanup(neo4j)
+        await drop_schema(neo4j)
+        print(f"Loading ~{args.nodes:,} nodes...")
+        existing = await load(neo4j, args.nodes)
+
+        without = await measure(neo4j, existing, existing, args.lookups)
+
+        await ensure_schema(neo4j)
+        await neo4j.execute_write("CALL db.awaitIndexes(600)")
+        with_schema = await measure(neo4j, existing, existing + 1000, args.lookups)
+
+        print(f"{'operation':<22} {'no schema':>12} {'with schema':>12}")
+        for name in without:
+            print(f"{name:<22} {without[name]:>9.1f} ms {with_schema[name]:>9.1f} ms")
+    finally:
+        await cleanup(neo4j)
+        await ensure_schema(neo4j)
+        await neo4j.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
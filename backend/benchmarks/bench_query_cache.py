@@ -0,0 +1,85 @@
+"""Per-file cost of compiling extraction queries on every call vs. using the cached registry.
+
+Run from the backend directory:
+
+    python benchmarks/bench_query_cache.py [--files N]
+"""
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tree_sitter import Query
+
+from parsers.languages import LANGUAGE_CONFIGS
+from parsers.treesitter import (
+    QUERY_KINDS, get_parser, get_query,
+    extract_functions, extract_classes, extract_imports, extract_calls,
+)
+
+SAMPLES = {
+    "python": "\n".join(
+        f"import mod_{i}\n\nclass Service{i}:\n    def handle_{i}(self, request) -> dict:\n"
+        f"        return helper_{i}(request) + self.other({i})\n"
+        for i in range(40)
+    ),
+    "typescript": "\n".join(
+        f"import {{ dep{i} }} from './dep{i}';\n\nclass Widget{i} {{\n"
+        f"    render{i}(props: Props): string {{ return format{i}(props); }}\n}}\n"
+        f"function build{i}(x: number): number {{ return compute{i}(x); }}\n"
+        for i in range(40)
+    ),
+}
+
+EXTRACTORS = {
+    "function": extract_functions,
+    "class": extract_classes,
+    "import": extract_imports,
+    "call": extract_calls,
+}
+
+
+def extract_all(root, content: bytes, queries: dict):
+    for kind in QUERY_KINDS:
+        EXTRACTORS[kind](root, content, queries.get(kind))
+
+
+def bench(language: str, files: int) -> tuple[float, float]:
+    content = SAMPLES[language].encode()
+    parser_info = get_parser(language)
+    root = parser_info["parser"].parse(content).root_node
+    config = LANGUAGE_CONFIGS[language]
+
+    start = time.perf_counter()
+    for _ in range(files):
+        queries = {
+            kind: Query(parser_info["language"], config[f"{kind}_query"])
+            for kind in QUERY_KINDS
+        }
+        extract_all(root, content, queries)
+    uncached = (time.perf_counter() - start) / files
+
+    cached_queries = {kind: get_query(language, kind) for kind in QUERY_KINDS}
+    start = time.perf_counter()
+    for _ in range(files):
+        extract_all(root, content, cached_queries)
+    cached = (time.perf_counter() - start) / files
+
+    return uncached, cached
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument("--files", type=int, default=200, help="files simulated per language")
+    args = arg_parser.parse_args()
+
+    print(f"{'language':<12} {'compile per file':>18} {'cached queries':>16} {'speedup':>9}")
+    for language in SAMPLES:
+        uncached, cached = bench(language, args.files)
+        print(f"{language:<12} {uncached * 1000:>15.3f} ms {cached * 1000:>13.3f} ms {uncached / cached:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+"""get_repo_graph latency over synthetic repos of increasing size, old vs. current export.
+
+The legacy export chained OPTIONAL MATCHes and deduplicated with collect(DISTINCT),
+so its intermediate rows grow with the product of per-file fan-outs. Needs a running
+Neo4j configured through the usual NEO4J_* settings; benchmark repos are removed
+afterwards.
+
+    python benchmarks/bench_repo_graph.py [--files 50 200 1000] [--functions 40] [--classes 10]
+"""
+import os
+import sys
+import time
+import asyncio
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from graph.neo4j_client import Neo4jClient
+from graph.queries import get_repo_graph
+
+LEGACY_NODES_QUERY = """
+MATCH (r:Repo {id: $repo_id})
+OPTIONAL MATCH (r)-[:HAS_FILE]->(f:File)
+OPTIONAL MATCH (f)-[:CONTAINS]->(fn:Function)
+OPTIONAL MATCH (f)-[:CONTAINS]->(c:Class)
+RETURN
+    collect(DISTINCT {id: r.id, label: r.name, type: 'Repo'}) as repos,
+    collect(DISTINCT {id: f.path, label: f.path, type: 'File', language: f.language}) as files,
+    collect(DISTINCT {id: fn.name + ':' + fn.file_path, label: fn.name, type: 'Function',
+                     start_line: fn.start_line, end_line: fn.end_line}) as functions,
+    collect(DISTINCT {id: c.name + ':' + c.file_path, label: c.name, type: 'Class',
+                     start_line: c.start_line, end_line: c.end_line}) as classes
+"""
+
+LEGACY_EDGES_QUERY = """
+MATCH (r:Repo {id: $repo_id})-[:HAS_FILE]->(f:File)
+OPTIONAL MATCH (f)-[:CONTAINS]->(fn:Function)
+OPTIONAL MATCH (f)-[:CONTAINS]->(c:Class)
+OPTIONAL MATCH (c)-[:HAS_METHOD]->(m:Function)
+OPTIONAL MATCH (fn)-[:CALLS]->(called:Function)
+OPTIONAL MATCH (f)-[:IMPORTS]->(mod:Module)
+RETURN
+    collect(DISTINCT {source: r.id, target: f.path, type: 'HAS_FILE'}) as repo_files,
+    collect(DISTINCT {source: f.path, target: fn.name + ':' + fn.file_path, type: 'CONTAINS'}) as file_functions,
+    collect(DISTINCT {source: f.path, target: c.name + ':' + c.file_path, type: 'CONTAINS'}) as file_classes,
+    collect(DISTINCT {source: c.name + ':' + c.file_path, target: m.name + ':' + m.file_path, type: 'HAS_METHOD'}) as class_methods,
+    collect(DISTINCT {source: fn.name + ':' + fn.file_path, target: called.name + ':' + called.file_path, type: 'CALLS'}) as function_calls
+"""
+
+
+async def build_repo(neo4j: Neo4jClient, repo_id: str, files: int, functions: int, classes: int):
+    """Files with `functions` functions and `classes` classes each; every class owns two
+    methods and every function calls the next one in its file."""
+    await neo4j.create_repo_node(repo_id, repo_id, f"bench://{repo_id}")
+    paths = [f"src/pkg_{i % 20}/module_{i}.py" for i in range(files)]
+    await neo4j.create_file_nodes(repo_id, [
+        {"path": path, "language": "python", "size": 0, "hash": ""} for path in paths
+    ])
+    await neo4j.create_function_nodes(repo_id, [
+        {"file_path": path, "name": f"func_{j}", "start_line": j, "end_line": j + 1,
+         "params": "()", "return_type": ""}
+        for path in paths for j in range(functions)
+    ])
+    await neo4j.create_class_nodes(repo_id, [
+        {"file_path": path, "name": f"Class_{j}", "start_line": j, "end_line": j + 1}
+        for path in paths for j in range(classes)
+    ])
+    await neo4j.execute_write_batches(
+        """
+        UNWIND $rows AS row
+        MATCH (c:Class {repo_id: $repo_id, file_path: row.path, name: row.cls})
+        MATCH (m:Function {repo_id: $repo_id, file_path: row.path, name: row.method})
+        MERGE (c)-[:HAS_METHOD]->(m)
+        """,
+        [
+            {"path": path, "cls": f"Class_{j}", "method": f"func_{(2 * j + k) % functions}"}
+            for path in paths for j in range(classes) for k in range(2)
+        ],
+        {"repo_id": repo_id},
+    )
+    await neo4j.execute_write_batches(
+        """
+        UNWIND $rows AS row
+        MATCH (a:Function {repo_id: $repo_id, file_path: row.path, name: row.caller})
+        MATCH (b:Function {repo_id: $repo_id, file_path: row.path, name: row.callee})
+        MERGE (a)-[:CALLS]->(b)
+        """,
+        [
+            {"path": path, "caller": f"func_{j}", "callee": f"func_{j + 1}"}
+            for path in paths for j in range(functions - 1)
+        ],
+        {"repo_id": repo_id},
+    )
+
+
+async def delete_repo(neo4j: Neo4jClient, repo_id: str):
+    await neo4j.execute_write(
+        """
+        MATCH (n) WHERE n.repo_id = $repo_id OR n.id = $repo_id
+        CALL { WITH n DETACH DELETE n } IN TRANSACTIONS OF 10000 ROWS
+        """,
+        {"repo_id": repo_id},
+    )
+
+
+async def timed(coro) -> tuple[float, object]:
+    start = time.perf_counter()
+    result = await coro
+    return (time.perf_counter() - start) * 1000, result
+
+
+async def legacy_export(neo4j: Neo4jClient, repo_id: str):
+    await neo4j.execute_query(LEGACY_NODES_QUERY, {"repo_id": repo_id})
+    await neo4j.execute_query(LEGACY_EDGES_QUERY, {"repo_id": repo_id})
+
+
+async def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument("--files", type=int, nargs="+", default=[50, 200, 1000])
+    arg_parser.add_argument("--functions", type=int, default=40)
+    arg_parser.add_argument("--classes", type=int, default=10)
+    arg_parser.add_argument("--skip-legacy-above", type=int, default=200,
+                            help="don't run the legacy export on repos with more files than this")
+    args = arg_parser.parse_args()
+
+    neo4j = Neo4jClient()
+    print(f"{'files':>6} {'nodes':>9} {'edges':>9} {'legacy':>12} {'current':>12}")
+    try:
+        for files in args.files:
+            repo_id = f"bench-graph-{files}"
+            await delete_repo(neo4j, repo_id)
+            await build_repo(neo4j, repo_id, files, args.functions, args.classes)
+
+            current_ms, graph = await timed(get_repo_graph(neo4j, repo_id))
+            legacy = "skipped"
+            if files <= args.skip_legacy_above:
+                legacy_ms, _ = await timed(legacy_export(neo4j, repo_id))
+                legacy = f"{legacy_ms:.0f} ms"
+
+            print(f"{files:>6} {len(graph['nodes']):>9,} {len(graph['edges']):>9,} "
+                  f"{legacy:>12} {current_ms:>9.0f} ms")
+            await delete_repo(neo4j, repo_id)
+    finally:
+        await neo4j.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
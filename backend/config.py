@@ -16,6 +16,9 @@ else:
 NEO4J_URI = os.getenv("NEO4J_URI", "")
 NEO4J_USER = os.getenv("NEO4J_USER", "neo4j")
 NEO4J_PASSWORD = os.getenv("NEO4J_PASSWORD", "")
+NEO4J_MAX_POOL_SIZE = int(os.getenv("NEO4J_MAX_POOL_SIZE", "50"))
+NEO4J_ACQUISITION_TIMEOUT = float(os.getenv("NEO4J_ACQUISITION_TIMEOUT", "30"))
+NEO4J_FETCH_SIZE = int(os.getenv("NEO4J_FETCH_SIZE", "1000"))
 
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY", "")
 
@@ -23,6 +26,11 @@ GITHUB_CLIENT_ID = os.getenv("GITHUB_CLIENT_ID", "")
 GITHUB_CLIENT_SECRET = os.getenv("GITHUB_CLIENT_SECRET", "")
 
 TEMP_CLONE_DIR = os.getenv("TEMP_CLONE_DIR", "./temp_repos")
+# Bare mirrors of analyzed repos, reused by later analyses, and their total size cap
+CLONE_MIRROR_DIR = os.getenv("CLONE_MIRROR_DIR", "./repo_mirrors")
+CLONE_MIRROR_MAX_MB = int(os.getenv("CLONE_MIRROR_MAX_MB", "2048"))
+# List and read files from the mirror's object database instead of a checked-out worktree
+COLLECT_FROM_GIT = os.getenv("COLLECT_FROM_GIT", "true").lower() in ("1", "true", "yes")
 
 SUPPORTED_LANGUAGES = {
     ".py": "python",
@@ -34,3 +42,50 @@ SUPPORTED_LANGUAGES = {
 
 MAX_FILE_SIZE_BYTES = 1_000_000
 MAX_FILES_PER_REPO = 5000
+
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "1000"))
+INGEST_FLUSH_FILES = int(os.getenv("INGEST_FLUSH_FILES", "100"))
+
+# 0 means one parse worker per CPU core
+PARSE_WORKERS = int(os.getenv("PARSE_WORKERS", "0"))
+# Files handed to the pool ahead of the ingest loop; bounds how much content is in memory at once
+PARSE_TASKS_PER_WORKER = int(os.getenv("PARSE_TASKS_PER_WORKER", "4"))
+
+ANALYSIS_CACHE_SIZE = int(os.getenv("ANALYSIS_CACHE_SIZE", "256"))
+
+MAX_CONCURRENT_ANALYSES = int(os.getenv("MAX_CONCURRENT_ANALYSES", "2"))
+JOB_QUEUE_SIZE = int(os.getenv("JOB_QUEUE_SIZE", "100"))
+JOB_HISTORY_SIZE = int(os.getenv("JOB_HISTORY_SIZE", "500"))
+
+GRAPH_PAGE_DEFAULT_NODES = int(os.getenv("GRAPH_PAGE_DEFAULT_NODES", "200"))
+GRAPH_PAGE_MAX_NODES = int(os.getenv("GRAPH_PAGE_MAX_NODES", "2000"))
+
+SEARCH_DEFAULT_LIMIT = int(os.getenv("SEARCH_DEFAULT_LIMIT", "50"))
+SEARCH_MAX_LIMIT = int(os.getenv("SEARCH_MAX_LIMIT", "200"))
+
+# Gemini response cache: in-memory LRU entries, time to live in seconds, and an
+# optional SQLite file for a persistent second tier (empty disables it)
+LLM_CACHE_SIZE = int(os.getenv("LLM_CACHE_SIZE", "512"))
+LLM_CACHE_TTL = int(os.getenv("LLM_CACHE_TTL", "86400"))
+LLM_CACHE_DB = os.getenv("LLM_CACHE_DB", "")
+
+# Source content store: SQLite file holding zstd-compressed file blobs, the lines per
+# independently compressed chunk, and the most lines a single read returns
+CONTENT_STORE_PATH = os.getenv("CONTENT_STORE_PATH", "./content_store.db")
+CONTENT_CHUNK_LINES = int(os.getenv("CONTENT_CHUNK_LINES", "64"))
+CONTENT_MAX_LINES = int(os.getenv("CONTENT_MAX_LINES", "500"))
+
+# Chat retrieval: symbol-index seeds, graph hops and neighbors per node expanded from
+# them, the cap on nodes visited, and the prompt budget (in tokens) for ranked code
+RETRIEVAL_SEEDS = int(os.getenv("RETRIEVAL_SEEDS", "10"))
+RETRIEVAL_MAX_HOPS = int(os.getenv("RETRIEVAL_MAX_HOPS", "2"))
+RETRIEVAL_FANOUT = int(os.getenv("RETRIEVAL_FANOUT", "25"))
+RETRIEVAL_MAX_NODES = int(os.getenv("RETRIEVAL_MAX_NODES", "300"))
+RETRIEVAL_TOKEN_BUDGET = int(os.getenv("RETRIEVAL_TOKEN_BUDGET", "3000"))
+RETRIEVAL_SNIPPET_LINES = int(os.getenv("RETRIEVAL_SNIPPET_LINES", "60"))
+
+# Semantic search: directory of per-repo vector indexes, vector width, and how much
+# of each function or class body is read into its vector
+EMBEDDING_DIR = os.getenv("EMBEDDING_DIR", "./embeddings")
+EMBEDDING_DIM = int(os.getenv("EMBEDDING_DIM", "256"))
+EMBEDDING_BODY_BYTES = int(os.getenv("EMBEDDING_BODY_BYTES", "2048"))
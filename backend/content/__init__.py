@@ -0,0 +1,7 @@
+from content.store import ContentStore, content_store, compress_lines
+
+__all__ = [
+    "ContentStore",
+    "content_store",
+    "compress_lines",
+]
@@ -0,0 +1,197 @@
+import asyncio
+import sqlite3
+import threading
+import logging
+from typing import Iterable, Optional
+
+import zstandard
+
+from config import CONTENT_STORE_PATH, CONTENT_CHUNK_LINES, CONTENT_MAX_LINES
+
+logger = logging.getLogger(__name__)
+
+_compressor: Optional[zstandard.ZstdCompressor] = None
+
+
+def compress_lines(content: bytes, chunk_lines: int = CONTENT_CHUNK_LINES) -> dict:
+    """Split raw file bytes into runs of chunk_lines lines and zstd-compress each run on its own.
+
+    Lines break on "\\n" only, the same way tree-sitter counts rows, so a node's
+    start_line/end_line index straight into the chunks. Returns the blob as
+    {"line_count", "chunk_lines", "chunks"}, ready for ContentStore.put_blobs.
+    """
+    global _compressor
+    if _compressor is None:
+        _compressor = zstandard.ZstdCompressor(level=3)
+
+    offsets = [0]
+    pos = content.find(b"\n")
+    while pos != -1:
+        offsets.append(pos + 1)
+        pos = content.find(b"\n", pos + 1)
+    line_count = len(offsets) if offsets[-1] < len(content) else len(offsets) - 1
+
+    chunks = []
+    for first in range(0, line_count, chunk_lines):
+        start = offsets[first]
+        end = offsets[first + chunk_lines] if first + chunk_lines < len(offsets) else len(content)
+        chunks.append(_compressor.compress(content[start:end]))
+    return {"line_count": line_count, "chunk_lines": chunk_lines, "chunks": chunks}
+
+
+class ContentStore:
+    """Source files of analyzed repos, kept on disk so code can be shown without a clone.
+
+    Blobs are keyed by the file hash computed at ingestion, so identical files are
+    stored once across paths, commits and repos. Each blob is cut into fixed runs of
+    lines compressed independently; the run holding a line is plain arithmetic, which
+    makes a line range read touch only the few chunks it overlaps instead of the
+    whole file.
+    """
+
+    def __init__(self, db_path: str, max_lines: int = CONTENT_MAX_LINES):
+        self._db_path = db_path
+        self._max_lines = max_lines
+        self._db_conn: Optional[sqlite3.Connection] = None
+        self._db_lock = threading.Lock()
+        self._decompressor = zstandard.ZstdDecompressor()
+
+    @property
+    def _db(self) -> sqlite3.Connection:
+        # Opened on first use: parse workers import this module only for compress_lines
+        if self._db_conn is None:
+            self._db_conn = sqlite3.connect(self._db_path, check_same_thread=False)
+            self._db_conn.executescript("""
+                PRAGMA journal_mode = WAL;
+                PRAGMA synchronous = NORMAL;
+                CREATE TABLE IF NOT EXISTS blobs (
+                    hash TEXT PRIMARY KEY, line_count INTEGER, chunk_lines INTEGER
+                ) WITHOUT ROWID;
+                CREATE TABLE IF NOT EXISTS chunks (
+                    hash TEXT, idx INTEGER, data BLOB, PRIMARY KEY (hash, idx)
+                ) WITHOUT ROWID;
+                CREATE TABLE IF NOT EXISTS files (
+                    repo_id TEXT, path TEXT, hash TEXT, PRIMARY KEY (repo_id, path)
+                ) WITHOUT ROWID;
+                CREATE INDEX IF NOT EXISTS files_hash ON files (hash);
+                CREATE TABLE IF NOT EXISTS pending (
+                    repo_id TEXT, hash TEXT, PRIMARY KEY (repo_id, hash)
+                ) WITHOUT ROWID;
+                CREATE INDEX IF NOT EXISTS pending_hash ON pending (hash);
+            """)
+        return self._db_conn
+
+    async def missing_blobs(self, hashes: Iterable[str]) -> set[str]:
+        """The hashes among the given ones that have no blob stored."""
+        return await asyncio.to_thread(self._missing_blobs, set(hashes))
+
+    async def put_blobs(self, repo_id: str, blobs: dict[str, dict]):
+        """Store blobs produced by compress_lines, keyed by file hash; known hashes are skipped.
+
+        Until the repo's next set_files the blobs are held for it, so another repo's
+        set_files can't collect them in between.
+        """
+        if blobs:
+            await asyncio.to_thread(self._put_blobs, repo_id, blobs)
+
+    async def set_files(self, repo_id: str, file_hashes: dict[str, str]):
+        """Make file_hashes (path -> hash) the repo's whole file list and drop the blobs
+        it let go of that nothing else points to."""
+        await asyncio.to_thread(self._set_files, repo_id, file_hashes)
+
+    async def get_lines(self, repo_id: str, path: str, start_line: int = 1,
+                        end_line: Optional[int] = None) -> Optional[str]:
+        """Lines start_line..end_line (1-based, inclusive) of a file, or None if it isn't stored.
+
+        end_line None reads to the end of the file. At most max_lines lines are returned.
+        """
+        return await asyncio.to_thread(self._get_lines, repo_id, path, start_line, end_line)
+
+    def _missing_blobs(self, hashes: set[str]) -> set[str]:
+        with self._db_lock:
+            self._db.execute("CREATE TEMP TABLE IF NOT EXISTS wanted (hash TEXT PRIMARY KEY)")
+            self._db.execute("DELETE FROM wanted")
+            self._db.executemany("INSERT OR IGNORE INTO wanted VALUES (?)", ((h,) for h in hashes))
+            stored = {row[0] for row in self._db.execute(
+                "SELECT wanted.hash FROM wanted JOIN blobs ON blobs.hash = wanted.hash"
+            )}
+        return hashes - stored
+
+    def _put_blobs(self, repo_id: str, blobs: dict[str, dict]):
+        with self._db_lock, self._db:
+            # Held even when the blob is already there: its last files row may be on its way out
+            self._db.executemany(
+                "INSERT OR IGNORE INTO pending VALUES (?, ?)", ((repo_id, file_hash) for file_hash in blobs)
+            )
+            for file_hash, blob in blobs.items():
+                inserted = self._db.execute(
+                    "INSERT OR IGNORE INTO blobs VALUES (?, ?, ?)",
+                    (file_hash, blob["line_count"], blob["chunk_lines"])
+                ).rowcount
+                if inserted:
+                    self._db.executemany(
+                        "INSERT OR REPLACE INTO chunks VALUES (?, ?, ?)",
+                        ((file_hash, idx, data) for idx, data in enumerate(blob["chunks"]))
+                    )
+
+    def _set_files(self, repo_id: str, file_hashes: dict[str, str]):
+        with self._db_lock, self._db:
+            previous = {row[0] for row in self._db.execute(
+                "SELECT hash FROM files WHERE repo_id = ? UNION SELECT hash FROM pending WHERE repo_id = ?",
+                (repo_id, repo_id)
+            )}
+            self._db.execute("DELETE FROM files WHERE repo_id = ?", (repo_id,))
+            self._db.execute("DELETE FROM pending WHERE repo_id = ?", (repo_id,))
+            self._db.executemany(
+                "INSERT INTO files VALUES (?, ?, ?)",
+                ((repo_id, path, file_hash) for path, file_hash in file_hashes.items())
+            )
+            # Only blobs this repo let go of are candidates, and one another analysis
+            # still holds through pending stays until that analysis sets its files
+            dropped = [(file_hash,) for file_hash in previous - set(file_hashes.values())]
+            self._db.executemany(
+                "DELETE FROM blobs WHERE hash = ? "
+                "AND NOT EXISTS (SELECT 1 FROM files WHERE files.hash = blobs.hash) "
+                "AND NOT EXISTS (SELECT 1 FROM pending WHERE pending.hash = blobs.hash)",
+                dropped
+            )
+            self._db.executemany(
+                "DELETE FROM chunks WHERE hash = ? AND NOT EXISTS (SELECT 1 FROM blobs WHERE blobs.hash = chunks.hash)",
+                dropped
+            )
+
+    def _get_lines(self, repo_id: str, path: str, start_line: int, end_line: Optional[int]) -> Optional[str]:
+        with self._db_lock:
+            blob = self._db.execute(
+                "SELECT blobs.hash, line_count, chunk_lines FROM files "
+                "JOIN blobs ON blobs.hash = files.hash WHERE repo_id = ? AND path = ?",
+                (repo_id, path)
+            ).fetchone()
+            if blob is None:
+                return None
+            file_hash, line_count, chunk_lines = blob
+
+            start_line = max(start_line, 1)
+            end_line = min(end_line or line_count, line_count, start_line + self._max_lines - 1)
+            if end_line < start_line:
+                return ""
+            first_chunk = (start_line - 1) // chunk_lines
+            last_chunk = (end_line - 1) // chunk_lines
+            rows = self._db.execute(
+                "SELECT data FROM chunks WHERE hash = ? AND idx BETWEEN ? AND ? ORDER BY idx",
+                (file_hash, first_chunk, last_chunk)
+            ).fetchall()
+            data = b"".join(self._decompressor.decompress(row[0]) for row in rows)
+
+        lines = data.split(b"\n")
+        offset = first_chunk * chunk_lines + 1
+        return b"\n".join(lines[start_line - offset:end_line - offset + 1]).decode("utf-8", errors="replace")
+
+    def close(self):
+        with self._db_lock:
+            if self._db_conn is not None:
+                self._db_conn.close()
+                self._db_conn = None
+
+
+content_store = ContentStore(CONTENT_STORE_PATH)
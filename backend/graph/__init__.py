@@ -1,13 +1,17 @@
 from graph.neo4j_client import Neo4jClient
-from graph.schema import NODE_LABELS, RELATIONSHIP_TYPES, NODE_COLORS
-from graph.queries import get_repo_graph, search_nodes, get_node_by_id
+from graph.schema import NODE_LABELS, RELATIONSHIP_TYPES, NODE_COLORS, ensure_schema, backfill_node_ids
+from graph.queries import get_repo_graph, get_graph_level, get_file_graph, search_nodes, get_node_by_id
 
 __all__ = [
     "Neo4jClient",
     "NODE_LABELS",
     "RELATIONSHIP_TYPES",
     "NODE_COLORS",
+    "ensure_schema",
+    "backfill_node_ids",
     "get_repo_graph",
+    "get_graph_level",
+    "get_file_graph",
     "search_nodes",
     "get_node_by_id",
 ]
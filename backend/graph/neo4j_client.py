@@ -1,10 +1,58 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
 from neo4j import AsyncGraphDatabase
 from typing import Optional
 import logging
-from config import NEO4J_URI, NEO4J_USER, NEO4J_PASSWORD
+from config import (
+    NEO4J_URI, NEO4J_USER, NEO4J_PASSWORD, INGEST_BATCH_SIZE,
+    NEO4J_MAX_POOL_SIZE, NEO4J_ACQUISITION_TIMEOUT, NEO4J_FETCH_SIZE,
+)
 
 logger = logging.getLogger(__name__)
 
+# The session (and explicit transaction, if any) bound to the running task, so the
+# statements of one logical operation share them instead of each opening a session
+_bound_session: ContextVar[Optional[dict]] = ContextVar("neo4j_bound_session", default=None)
+
+
+class PoolMetrics:
+    """Session checkouts against the connection pool: how busy it is and how long callers wait.
+
+    Every session holds at most one pooled connection, so sessions are gated by a
+    semaphore of the pool's size and the time spent on it is the acquisition wait.
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self.in_use = 0
+        self.peak_in_use = 0
+        self.waiting = 0
+        self.acquisitions = 0
+        self.timeouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def record_acquired(self, wait: float):
+        self.acquisitions += 1
+        self.in_use += 1
+        self.peak_in_use = max(self.peak_in_use, self.in_use)
+        self.wait_total += wait
+        self.wait_max = max(self.wait_max, wait)
+
+    def to_dict(self) -> dict:
+        return {
+            "max_size": self.max_size,
+            "in_use": self.in_use,
+            "peak_in_use": self.peak_in_use,
+            "waiting": self.waiting,
+            "acquisitions": self.acquisitions,
+            "timeouts": self.timeouts,
+            "wait_avg_ms": round(1000 * self.wait_total / self.acquisitions, 3) if self.acquisitions else 0.0,
+            "wait_max_ms": round(1000 * self.wait_max, 3),
+        }
+
 
 class Neo4jClient:
     _instance: Optional["Neo4jClient"] = None
@@ -21,29 +69,164 @@ class Neo4jClient:
             raise ValueError("NEO4J_URI and NEO4J_PASSWORD must be set")
         self._driver = AsyncGraphDatabase.driver(
             NEO4J_URI,
-            auth=(NEO4J_USER, NEO4J_PASSWORD)
+            auth=(NEO4J_USER, NEO4J_PASSWORD),
+            max_connection_pool_size=NEO4J_MAX_POOL_SIZE,
+            connection_acquisition_timeout=NEO4J_ACQUISITION_TIMEOUT,
+            fetch_size=NEO4J_FETCH_SIZE,
         )
-        logger.info("Neo4j driver initialized")
+        self._slots = asyncio.Semaphore(NEO4J_MAX_POOL_SIZE)
+        self.metrics = PoolMetrics(NEO4J_MAX_POOL_SIZE)
+        logger.info(f"Neo4j driver initialized (pool size {NEO4J_MAX_POOL_SIZE})")
+
+    async def connect(self):
+        """Open the pool eagerly at startup so the first request doesn't pay for it."""
+        await self._driver.verify_connectivity()
 
     async def close(self):
         if self._driver:
             await self._driver.close()
+            self._driver = None
+        # The next Neo4jClient() builds a fresh driver
+        if Neo4jClient._instance is self:
+            Neo4jClient._instance = None
+
+    async def _acquire_slot(self):
+        start = time.perf_counter()
+        self.metrics.waiting += 1
+        try:
+            await asyncio.wait_for(self._slots.acquire(), NEO4J_ACQUISITION_TIMEOUT)
+        except asyncio.TimeoutError:
+            self.metrics.timeouts += 1
+            raise
+        finally:
+            self.metrics.waiting -= 1
+        self.metrics.record_acquired(time.perf_counter() - start)
+
+    def _release_slot(self):
+        self.metrics.in_use -= 1
+        self._slots.release()
+
+    @staticmethod
+    def _bound() -> Optional[dict]:
+        bound = _bound_session.get()
+        # Tasks inherit context vars, but a session must never be shared across tasks
+        if bound and bound["task"] is asyncio.current_task():
+            return bound
+        return None
+
+    @asynccontextmanager
+    async def session(self):
+        """Session for a multi-statement operation; execute_* calls inside it reuse it.
+
+        Nested calls in the same task join the outer session. A task spawned while
+        its parent holds a session may not open one of its own: the parent keeps its
+        pool slot while it waits on the child, so once the pool is saturated neither
+        could ever proceed. Such nesting raises RuntimeError instead of deadlocking.
+        """
+        bound = self._bound()
+        if bound:
+            yield bound["session"]
+            return
+        inherited = _bound_session.get()
+        if inherited and inherited["open"]:
+            raise RuntimeError("Neo4j session opened from a task spawned inside another open session")
+        await self._acquire_slot()
+        try:
+            async with self._driver.session() as session:
+                bound = {"task": asyncio.current_task(), "session": session, "tx": None, "open": True}
+                token = _bound_session.set(bound)
+                try:
+                    yield session
+                finally:
+                    bound["open"] = False
+                    _bound_session.reset(token)
+        finally:
+            self._release_slot()
+
+    @asynccontextmanager
+    async def transaction(self):
+        """Explicit transaction spanning every execute_* call inside it.
+
+        Commits when the block exits cleanly and rolls back otherwise; reads inside it
+        see one consistent snapshot. Nested calls join the outer transaction.
+        """
+        async with self.session() as session:
+            bound = self._bound()
+            if bound["tx"] is not None:
+                yield bound["tx"]
+                return
+            tx = await session.begin_transaction()
+            bound["tx"] = tx
+            try:
+                yield tx
+            except BaseException:
+                await tx.rollback()
+                raise
+            else:
+                await tx.commit()
+            finally:
+                bound["tx"] = None
+                await tx.close()
+
+    async def read_transaction(self, work, *args):
+        """Return await work(*args) with every execute_query inside it in one read transaction.
+
+        The transaction is managed by the driver: it is routed to a reader and work is
+        retried on transient errors, so work must only read. Inside an explicit
+        transaction work simply joins it.
+        """
+        async with self.session() as session:
+            bound = self._bound()
+            if bound["tx"] is not None:
+                return await work(*args)
+
+            async def run(tx):
+                bound["tx"] = tx
+                try:
+                    return await work(*args)
+                finally:
+                    bound["tx"] = None
+
+            return await session.execute_read(run)
 
     async def execute_query(self, query: str, parameters: dict = None):
-        async with self._driver.session() as session:
-            result = await session.run(query, parameters or {})
+        async with self.session() as session:
+            runner = self._bound()["tx"] or session
+            result = await runner.run(query, parameters or {})
             return await result.data()
 
     async def execute_write(self, query: str, parameters: dict = None):
-        async with self._driver.session() as session:
-            result = await session.run(query, parameters or {})
+        async with self.session() as session:
+            runner = self._bound()["tx"] or session
+            result = await runner.run(query, parameters or {})
             summary = await result.consume()
             return summary.counters
 
+    async def execute_write_batches(self, query: str, rows: list[dict], parameters: dict = None,
+                                    batch_size: int = None):
+        """Run an `UNWIND $rows` write query over rows in chunks, one transaction per chunk."""
+        batch_size = batch_size or INGEST_BATCH_SIZE
+        params = dict(parameters or {})
+
+        async def run_batch(tx, batch):
+            result = await tx.run(query, {**params, "rows": batch})
+            await result.consume()
+
+        async with self.session() as session:
+            tx = self._bound()["tx"]
+            for start in range(0, len(rows), batch_size):
+                if tx is not None:
+                    await run_batch(tx, rows[start:start + batch_size])
+                else:
+                    await session.execute_write(run_batch, rows[start:start + batch_size])
+
     async def create_repo_node(self, repo_id: str, name: str, url: str):
+        # commit_sha is only set again once the analysis completes, so a repo that is
+        # mid-(re)analysis never answers a commit cache lookup
         query = """
         MERGE (r:Repo {id: $repo_id})
         SET r.name = $name, r.url = $url, r.analyzed_at = datetime()
+        REMOVE r.commit_sha
         RETURN r
         """
         return await self.execute_write(query, {
@@ -52,11 +235,96 @@ class Neo4jClient:
             "url": url
         })
 
+    async def mark_repo_analyzed(self, repo_id: str, commit_sha: Optional[str],
+                                 content_hash: Optional[str] = None) -> int:
+        """Record the analyzed commit and content hash and return the repo's file, function and class count."""
+        query = """
+        MATCH (r:Repo {id: $repo_id})
+        SET r.commit_sha = $commit_sha,
+            r.content_hash = $content_hash,
+            r.node_count = COUNT { (r)-[:HAS_FILE]->(:File) }
+                         + COUNT { (r)-[:HAS_FILE]->(:File)-[:CONTAINS]->() }
+        RETURN r.node_count as node_count
+        """
+        result = await self.execute_query(query, {
+            "repo_id": repo_id,
+            "commit_sha": commit_sha,
+            "content_hash": content_hash
+        })
+        return result[0]["node_count"] if result else 0
+
+    async def set_repo_context(self, repo_id: str, context: Optional[str]):
+        query = """
+        MATCH (r:Repo {id: $repo_id})
+        SET r.context = $context
+        """
+        await self.execute_write(query, {"repo_id": repo_id, "context": context})
+
+    async def find_analysis(self, url: str, commit_sha: str) -> Optional[dict]:
+        query = """
+        MATCH (r:Repo {url: $url, commit_sha: $commit_sha})
+        RETURN r.id as repo_id, r.node_count as node_count
+        LIMIT 1
+        """
+        result = await self.execute_query(query, {"url": url, "commit_sha": commit_sha})
+        return result[0] if result else None
+
+    async def find_repo_by_url(self, url: str) -> Optional[str]:
+        query = """
+        MATCH (r:Repo {url: $url})
+        RETURN r.id as id
+        ORDER BY r.analyzed_at DESC
+        LIMIT 1
+        """
+        result = await self.execute_query(query, {"url": url})
+        return result[0]["id"] if result else None
+
+    async def get_file_hashes(self, repo_id: str) -> dict[str, str]:
+        query = """
+        MATCH (f:File {repo_id: $repo_id})
+        RETURN f.path as path, f.hash as hash
+        """
+        result = await self.execute_query(query, {"repo_id": repo_id})
+        return {row["path"]: row["hash"] for row in result}
+
+    async def delete_file_nodes(self, repo_id: str, paths: list[str], batch_size: int = None):
+        """Remove files and everything they contain from the graph."""
+        query = """
+        UNWIND $rows AS path
+        MATCH (f:File {path: path, repo_id: $repo_id})
+        OPTIONAL MATCH (f)-[:CONTAINS]->(child)
+        DETACH DELETE child, f
+        """
+        await self.execute_write_batches(query, paths, {"repo_id": repo_id}, batch_size)
+
+    async def prune_file_contents(self, repo_id: str, rows: list[dict], batch_size: int = None):
+        """Drop what a re-parsed file no longer contains before its new rows are merged.
+
+        Each row holds a file path and the function and class names it now defines.
+        Nodes that survive keep their incoming relationships; imports and class
+        membership are rewritten from the new parse.
+        """
+        query = """
+        UNWIND $rows AS row
+        MATCH (f:File {path: row.path, repo_id: $repo_id})
+        OPTIONAL MATCH (f)-[imp:IMPORTS]->(:Module)
+        DELETE imp
+        WITH DISTINCT f, row
+        OPTIONAL MATCH (f)-[:CONTAINS]->(:Class)-[method:HAS_METHOD]->(:Function)
+        DELETE method
+        WITH DISTINCT f, row
+        OPTIONAL MATCH (f)-[:CONTAINS]->(child)
+        WHERE (child:Function AND NOT child.name IN row.functions)
+           OR (child:Class AND NOT child.name IN row.classes)
+        DETACH DELETE child
+        """
+        await self.execute_write_batches(query, rows, {"repo_id": repo_id}, batch_size)
+
     async def create_file_node(self, repo_id: str, path: str, language: str, size: int, content_hash: str):
         query = """
         MATCH (r:Repo {id: $repo_id})
         MERGE (f:File {path: $path, repo_id: $repo_id})
-        SET f.language = $language, f.size = $size, f.hash = $content_hash
+        SET f.language = $language, f.size = $size, f.hash = $content_hash, f.node_id = $path
         MERGE (r)-[:HAS_FILE]->(f)
         RETURN f
         """
@@ -74,7 +342,8 @@ class Neo4jClient:
         MATCH (f:File {path: $file_path, repo_id: $repo_id})
         MERGE (fn:Function {name: $name, file_path: $file_path, repo_id: $repo_id})
         SET fn.start_line = $start_line, fn.end_line = $end_line,
-            fn.params = $params, fn.return_type = $return_type
+            fn.params = $params, fn.return_type = $return_type,
+            fn.node_id = $name + ':' + $file_path
         MERGE (f)-[:CONTAINS]->(fn)
         RETURN fn
         """
@@ -93,7 +362,7 @@ class Neo4jClient:
         query = """
         MATCH (f:File {path: $file_path, repo_id: $repo_id})
         MERGE (c:Class {name: $name, file_path: $file_path, repo_id: $repo_id})
-        SET c.start_line = $start_line, c.end_line = $end_line
+        SET c.start_line = $start_line, c.end_line = $end_line, c.node_id = $name + ':' + $file_path
         MERGE (f)-[:CONTAINS]->(c)
         RETURN c
         """
@@ -137,6 +406,7 @@ class Neo4jClient:
         query = """
         MATCH (f:File {path: $file_path, repo_id: $repo_id})
         MERGE (m:Module {name: $module_name, repo_id: $repo_id})
+        SET m.node_id = $module_name
         MERGE (f)-[:IMPORTS]->(m)
         """
         return await self.execute_write(query, {
@@ -144,3 +414,114 @@ class Neo4jClient:
             "file_path": file_path,
             "module_name": module_name
         })
+
+    async def create_file_nodes(self, repo_id: str, rows: list[dict], batch_size: int = None):
+        query = """
+        MATCH (r:Repo {id: $repo_id})
+        UNWIND $rows AS row
+        MERGE (f:File {path: row.path, repo_id: $repo_id})
+        SET f.language = row.language, f.size = row.size, f.hash = row.hash, f.node_id = row.path
+        MERGE (r)-[:HAS_FILE]->(f)
+        """
+        await self.execute_write_batches(query, rows, {"repo_id": repo_id}, batch_size)
+
+    async def create_function_nodes(self, repo_id: str, rows: list[dict], batch_size: int = None):
+        query = """
+        UNWIND $rows AS row
+        MATCH (f:File {path: row.file_path, repo_id: $repo_id})
+        MERGE (fn:Function {name: row.name, file_path: row.file_path, repo_id: $repo_id})
+        SET fn.start_line = row.start_line, fn.end_line = row.end_line,
+            fn.params = row.params, fn.return_type = row.return_type,
+            fn.node_id = row.name + ':' + row.file_path, fn.calls = row.calls
+        MERGE (f)-[:CONTAINS]->(fn)
+        """
+        await self.execute_write_batches(query, rows, {"repo_id": repo_id}, batch_size)
+
+    async def create_class_nodes(self, repo_id: str, rows: list[dict], batch_size: int = None):
+        query = """
+        UNWIND $rows AS row
+        MATCH (f:File {path: row.file_path, repo_id: $repo_id})
+        MERGE (c:Class {name: row.name, file_path: row.file_path, repo_id: $repo_id})
+        SET c.start_line = row.start_line, c.end_line = row.end_line,
+            c.node_id = row.name + ':' + row.file_path
+        MERGE (f)-[:CONTAINS]->(c)
+        """
+        await self.execute_write_batches(query, rows, {"repo_id": repo_id}, batch_size)
+
+    async def create_import_relationships(self, repo_id: str, rows: list[dict], batch_size: int = None):
+        query = """
+        UNWIND $rows AS row
+        MATCH (f:File {path: row.file_path, repo_id: $repo_id})
+        MERGE (m:Module {name: row.module_name, repo_id: $repo_id})
+        SET m.node_id = row.module_name
+        MERGE (f)-[:IMPORTS]->(m)
+        """
+        await self.execute_write_batches(query, rows, {"repo_id": repo_id}, batch_size)
+
+    async def create_method_relationships(self, repo_id: str, rows: list[dict], batch_size: int = None):
+        query = """
+        UNWIND $rows AS row
+        MATCH (c:Class {repo_id: $repo_id, node_id: row.class_name + ':' + row.file_path})
+        MATCH (fn:Function {repo_id: $repo_id, node_id: row.name + ':' + row.file_path})
+        MERGE (c)-[:HAS_METHOD]->(fn)
+        """
+        await self.execute_write_batches(query, rows, {"repo_id": repo_id}, batch_size)
+
+    async def get_file_symbols(self, repo_id: str, paths: list[str]) -> list[dict]:
+        """Functions (with the names they call) and imports of files already in the graph."""
+        query = """
+        UNWIND $paths AS path
+        MATCH (f:File {path: path, repo_id: $repo_id})
+        RETURN f.path as path,
+               [(f)-[:CONTAINS]->(fn:Function) | {name: fn.name, calls: coalesce(fn.calls, [])}] as functions,
+               [(f)-[:IMPORTS]->(m:Module) | m.name] as imports
+        """
+        return await self.execute_query(query, {"repo_id": repo_id, "paths": paths})
+
+    async def get_call_relationships(self, repo_id: str) -> set[tuple[str, str]]:
+        query = """
+        MATCH (a:Function {repo_id: $repo_id})-[:CALLS]->(b:Function)
+        RETURN a.node_id as source, b.node_id as target
+        """
+        result = await self.execute_query(query, {"repo_id": repo_id})
+        return {(row["source"], row["target"]) for row in result}
+
+    async def create_call_relationships(self, repo_id: str, rows: list[dict], batch_size: int = None):
+        query = """
+        UNWIND $rows AS row
+        MATCH (caller:Function {repo_id: $repo_id, node_id: row.source})
+        MATCH (callee:Function {repo_id: $repo_id, node_id: row.target})
+        MERGE (caller)-[:CALLS]->(callee)
+        """
+        await self.execute_write_batches(query, rows, {"repo_id": repo_id}, batch_size)
+
+    async def delete_call_relationships(self, repo_id: str, rows: list[dict], batch_size: int = None):
+        query = """
+        UNWIND $rows AS row
+        MATCH (:Function {repo_id: $repo_id, node_id: row.source})-[r:CALLS]->
+              (:Function {repo_id: $repo_id, node_id: row.target})
+        DELETE r
+        """
+        await self.execute_write_batches(query, rows, {"repo_id": repo_id}, batch_size)
+
+    async def bulk_ingest(self, repo_id: str, files: list[dict] = None, functions: list[dict] = None,
+                          classes: list[dict] = None, imports: list[dict] = None,
+                          methods: list[dict] = None, changed_files: list[dict] = None,
+                          batch_size: int = None):
+        """Write parsed rows in dependency order: files first, then everything hanging off them.
+
+        changed_files lists re-parsed files whose stale contents are pruned before anything is merged.
+        """
+        async with self.session():
+            if changed_files:
+                await self.prune_file_contents(repo_id, changed_files, batch_size)
+            if files:
+                await self.create_file_nodes(repo_id, files, batch_size)
+            if functions:
+                await self.create_function_nodes(repo_id, functions, batch_size)
+            if classes:
+                await self.create_class_nodes(repo_id, classes, batch_size)
+            if imports:
+                await self.create_import_relationships(repo_id, imports, batch_size)
+            if methods:
+                await self.create_method_relationships(repo_id, methods, batch_size)
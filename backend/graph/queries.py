@@ -1,117 +1,540 @@
+import base64
+import re
+from typing import Optional
+
+from config import GRAPH_PAGE_DEFAULT_NODES, GRAPH_PAGE_MAX_NODES, SEARCH_DEFAULT_LIMIT, SEARCH_MAX_LIMIT
 from graph.neo4j_client import Neo4jClient
-from graph.schema import NODE_COLORS
+from graph.schema import NODE_COLORS, NODE_LABELS, SEARCH_INDEX
+
+
+# One query per node or relationship type. Each returns exactly one row per node or
+# edge, so export work is linear in graph size instead of the product of per-file
+# fan-outs that chained OPTIONAL MATCHes produce.
+REPO_QUERY = """
+MATCH (r:Repo {id: $repo_id})
+RETURN r.id as id, r.name as label
+"""
+
+FILES_QUERY = """
+MATCH (r:Repo {id: $repo_id})-[:HAS_FILE]->(f:File)
+RETURN f.path as id, f.language as language
+"""
+
+CONTAINED_QUERY = """
+MATCH (f:File {repo_id: $repo_id})-[:CONTAINS]->(n:%s)
+RETURN f.path as source, n.node_id as id, n.name as label,
+       n.start_line as start_line, n.end_line as end_line
+"""
+
+CLASS_METHODS_QUERY = """
+MATCH (c:Class {repo_id: $repo_id})-[:HAS_METHOD]->(m:Function)
+RETURN c.node_id as source, m.node_id as target
+"""
+
+FUNCTION_CALLS_QUERY = """
+MATCH (fn:Function {repo_id: $repo_id})-[:CALLS]->(called:Function)
+RETURN fn.node_id as source, called.node_id as target
+"""
+
+
+def _edge(source: str, target: str, edge_type: str) -> dict:
+    return {
+        "id": f"{source}-{target}",
+        "source": source,
+        "target": target,
+        "type": edge_type
+    }
+
+
+def _element_node(row: dict, node_type: str, color: str) -> dict:
+    return {
+        "id": row["id"],
+        "data": {"label": row["label"], "startLine": row.get("start_line"), "endLine": row.get("end_line")},
+        "type": node_type,
+        "style": {"backgroundColor": color}
+    }
 
 
 async def get_repo_graph(neo4j: Neo4jClient, repo_id: str) -> dict:
-    nodes_query = """
-    MATCH (r:Repo {id: $repo_id})
-    OPTIONAL MATCH (r)-[:HAS_FILE]->(f:File)
-    OPTIONAL MATCH (f)-[:CONTAINS]->(fn:Function)
-    OPTIONAL MATCH (f)-[:CONTAINS]->(c:Class)
-    RETURN 
-        collect(DISTINCT {id: r.id, label: r.name, type: 'Repo'}) as repos,
-        collect(DISTINCT {id: f.path, label: f.path, type: 'File', language: f.language}) as files,
-        collect(DISTINCT {id: fn.name + ':' + fn.file_path, label: fn.name, type: 'Function', 
-                         start_line: fn.start_line, end_line: fn.end_line}) as functions,
-        collect(DISTINCT {id: c.name + ':' + c.file_path, label: c.name, type: 'Class',
-                         start_line: c.start_line, end_line: c.end_line}) as classes
-    """
+    params = {"repo_id": repo_id}
     
-    edges_query = """
-    MATCH (r:Repo {id: $repo_id})-[:HAS_FILE]->(f:File)
-    OPTIONAL MATCH (f)-[:CONTAINS]->(fn:Function)
-    OPTIONAL MATCH (f)-[:CONTAINS]->(c:Class)
-    OPTIONAL MATCH (c)-[:HAS_METHOD]->(m:Function)
-    OPTIONAL MATCH (fn)-[:CALLS]->(called:Function)
-    OPTIONAL MATCH (f)-[:IMPORTS]->(mod:Module)
-    RETURN 
-        collect(DISTINCT {source: r.id, target: f.path, type: 'HAS_FILE'}) as repo_files,
-        collect(DISTINCT {source: f.path, target: fn.name + ':' + fn.file_path, type: 'CONTAINS'}) as file_functions,
-        collect(DISTINCT {source: f.path, target: c.name + ':' + c.file_path, type: 'CONTAINS'}) as file_classes,
-        collect(DISTINCT {source: c.name + ':' + c.file_path, target: m.name + ':' + m.file_path, type: 'HAS_METHOD'}) as class_methods,
-        collect(DISTINCT {source: fn.name + ':' + fn.file_path, target: called.name + ':' + called.file_path, type: 'CALLS'}) as function_calls
+    async def read():
+        repo_result = await neo4j.execute_query(REPO_QUERY, params)
+        if not repo_result:
+            return None
+        return [repo_result] + [
+            await neo4j.execute_query(query, params)
+            for query in (FILES_QUERY, CONTAINED_QUERY % "Function", CONTAINED_QUERY % "Class",
+                          CLASS_METHODS_QUERY, FUNCTION_CALLS_QUERY)
+        ]
+    
+    # One read transaction so every element type comes from the same snapshot
+    results = await neo4j.read_transaction(read)
+    if results is None:
+        return {"nodes": [], "edges": []}
+    repo_result, files, functions, classes, class_methods, function_calls = results
+    
+    nodes = []
+    edges = []
+    
+    repo = repo_result[0]
+    nodes.append({
+        "id": repo["id"],
+        "data": {"label": repo["label"]},
+        "type": "repo",
+        "style": {"backgroundColor": NODE_COLORS["Repo"]}
+    })
+    for file in files:
+        nodes.append({
+            "id": file["id"],
+            "data": {"label": file["id"].split("/")[-1], "fullPath": file["id"]},
+            "type": "file",
+            "style": {"backgroundColor": NODE_COLORS["File"]}
+        })
+    for func in functions:
+        if func["id"]:
+            nodes.append(_element_node(func, "function", NODE_COLORS["Function"]))
+    for cls in classes:
+        if cls["id"]:
+            nodes.append(_element_node(cls, "class", NODE_COLORS["Class"]))
+    
+    for file in files:
+        edges.append(_edge(repo["id"], file["id"], "HAS_FILE"))
+    for rows, edge_type in [(functions, "CONTAINS"), (classes, "CONTAINS")]:
+        for row in rows:
+            if row["id"]:
+                edges.append(_edge(row["source"], row["id"], edge_type))
+    for rows, edge_type in [(class_methods, "HAS_METHOD"), (function_calls, "CALLS")]:
+        for row in rows:
+            if row["source"] and row["target"]:
+                edges.append(_edge(row["source"], row["target"], edge_type))
+    
+    return {"nodes": nodes, "edges": edges}
+
+
+# Level-of-detail queries: a directory level is built from per-file counts, and a
+# single file's elements are paged straight out of Neo4j in node_id order.
+LEVEL_CHILDREN_QUERY = """
+MATCH (f:File {repo_id: $repo_id})
+WHERE f.path STARTS WITH $prefix AND ($after IS NULL OR f.path > $after)
+WITH f, substring(f.path, size($prefix)) as rest
+WITH f, rest CONTAINS '/' as is_dir,
+     CASE WHEN rest CONTAINS '/' THEN $prefix + split(rest, '/')[0] ELSE f.path END as id,
+     COUNT { (f)-[:CONTAINS]->(:Function) } as functions,
+     COUNT { (f)-[:CONTAINS]->(:Class) } as classes
+WHERE $after IS NULL OR id > $after
+RETURN id, is_dir, count(f) as files, sum(functions) as functions, sum(classes) as classes
+ORDER BY id
+LIMIT $limit
+"""
+
+LEVEL_CALLS_QUERY = """
+UNWIND $starts as start
+MATCH (a:Function {repo_id: $repo_id})-[:CALLS]->(b:Function {repo_id: $repo_id})
+WHERE a.file_path STARTS WITH start AND (start ENDS WITH '/' OR a.file_path = start)
+  AND b.file_path STARTS WITH $prefix AND a.file_path <> b.file_path
+RETURN a.file_path as source, b.file_path as target, count(*) as weight
+"""
+
+FILE_ELEMENTS_QUERY = """
+MATCH (f:File {repo_id: $repo_id, path: $path})-[:CONTAINS]->(n)
+WITH n, n.node_id as id
+WHERE $after IS NULL OR id > $after
+RETURN id, labels(n)[0] as label_type, n.name as label,
+       n.start_line as start_line, n.end_line as end_line
+ORDER BY id
+LIMIT $limit
+"""
+
+FILE_ELEMENT_EDGES_QUERY = """
+MATCH (:File {repo_id: $repo_id, path: $path})-[:CONTAINS]->(a)-[r:HAS_METHOD|CALLS]->(b)
+WHERE a.node_id IN $ids
+RETURN a.node_id as source, b.node_id as target, type(r) as type
+"""
+
+
+def encode_cursor(key: str) -> str:
+    return base64.urlsafe_b64encode(key.encode()).decode()
+
+
+def decode_cursor(cursor: Optional[str]) -> Optional[str]:
+    if not cursor:
+        return None
+    try:
+        return base64.urlsafe_b64decode(cursor.encode()).decode()
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError("Invalid cursor")
+
+
+def clamp_page_size(max_nodes: Optional[int]) -> int:
+    return max(1, min(max_nodes or GRAPH_PAGE_DEFAULT_NODES, GRAPH_PAGE_MAX_NODES))
+
+
+def _directory_prefix(path: str) -> str:
+    path = path.strip("/")
+    return f"{path}/" if path else ""
+
+
+def _child_of(prefix: str, file_path: str) -> tuple[str, bool]:
+    """Map a file under prefix to the id of its immediate child and whether that child is a directory."""
+    rest = file_path[len(prefix):]
+    if "/" in rest:
+        return prefix + rest.split("/", 1)[0], True
+    return file_path, False
+
+
+async def get_graph_level(neo4j: Neo4jClient, repo_id: str, path: str = "",
+                          cursor: Optional[str] = None, max_nodes: Optional[int] = None) -> dict:
+    """One directory level of the repo: its subdirectories with aggregated counts and its files.
+
+    The root level (path "") hangs off the repo node. Children are paged in id order
+    with an opaque cursor, at most max_nodes per page. Grouping, ordering and the cursor
+    all run in Cypher, and only files past the cursor are read, so a deep page costs no
+    full scan of the level. CALLS from the page's files are aggregated into weighted
+    edges, kept only when both ends are on the page.
     """
+    return await neo4j.read_transaction(_read_graph_level, neo4j, repo_id, path, cursor, max_nodes)
+
 
-    nodes_result = await neo4j.execute_query(nodes_query, {"repo_id": repo_id})
-    edges_result = await neo4j.execute_query(edges_query, {"repo_id": repo_id})
+async def _read_graph_level(neo4j: Neo4jClient, repo_id: str, path: str,
+                            cursor: Optional[str], max_nodes: Optional[int]) -> dict:
+    prefix = _directory_prefix(path)
+    limit = clamp_page_size(max_nodes)
+    after = decode_cursor(cursor)
+    params = {"repo_id": repo_id, "prefix": prefix}
+    
+    # One row more than the page tells whether another page follows
+    children = await neo4j.execute_query(
+        LEVEL_CHILDREN_QUERY, {**params, "after": after, "limit": limit + 1}
+    )
+    page = children[:limit]
+    next_cursor = encode_cursor(page[-1]["id"]) if len(children) > limit else None
+    
+    if prefix:
+        parent_id = prefix.rstrip("/")
+        parent_label = parent_id.split("/")[-1]
+        parent_type = "directory"
+    else:
+        repo_result = await neo4j.execute_query(REPO_QUERY, {"repo_id": repo_id})
+        if not repo_result:
+            return {"nodes": [], "edges": [], "next_cursor": None}
+        parent_id = repo_result[0]["id"]
+        parent_label = repo_result[0]["label"]
+        parent_type = "repo"
     
     nodes = []
     edges = []
+    if after is None:
+        nodes.append({
+            "id": parent_id,
+            "data": {"label": parent_label, "fullPath": prefix.rstrip("/")},
+            "type": parent_type,
+            "style": {"backgroundColor": NODE_COLORS["Repo" if parent_type == "repo" else "Directory"]}
+        })
     
-    if not nodes_result or len(nodes_result) == 0:
-        return {"nodes": [], "edges": []}
+    for child in page:
+        child_id = child["id"]
+        data = {
+            "label": child_id.split("/")[-1],
+            "fullPath": child_id,
+            "functionCount": child["functions"],
+            "classCount": child["classes"],
+        }
+        if child["is_dir"]:
+            data["fileCount"] = child["files"]
+            node_type, color = "directory", NODE_COLORS["Directory"]
+        else:
+            node_type, color = "file", NODE_COLORS["File"]
+        nodes.append({"id": child_id, "data": data, "type": node_type, "style": {"backgroundColor": color}})
+        edges.append(_edge(parent_id, child_id, "HAS_FILE" if parent_type == "repo" and not child["is_dir"] else "CONTAINS"))
+    
+    on_page = {child["id"] for child in page}
+    starts = [child["id"] + "/" if child["is_dir"] else child["id"] for child in page]
+    weights = {}
+    for row in await neo4j.execute_query(LEVEL_CALLS_QUERY, {**params, "starts": starts}):
+        source = _child_of(prefix, row["source"])[0]
+        target = _child_of(prefix, row["target"])[0]
+        if source in on_page and target in on_page and source != target:
+            weights[(source, target)] = weights.get((source, target), 0) + row["weight"]
+    for (source, target), weight in weights.items():
+        edge = _edge(source, target, "CALLS")
+        edge["data"] = {"weight": weight}
+        edges.append(edge)
     
-    if nodes_result:
-        data = nodes_result[0]
-        for repo in data.get("repos", []):
-            if repo.get("id"):
-                nodes.append({
-                    "id": repo["id"],
-                    "data": {"label": repo["label"]},
-                    "type": "repo",
-                    "style": {"backgroundColor": NODE_COLORS["Repo"]}
-                })
-        for file in data.get("files", []):
-            if file.get("id"):
-                nodes.append({
-                    "id": file["id"],
-                    "data": {"label": file["label"].split("/")[-1], "fullPath": file["label"]},
-                    "type": "file",
-                    "style": {"backgroundColor": NODE_COLORS["File"]}
-                })
-        for func in data.get("functions", []):
-            if func.get("id"):
-                nodes.append({
-                    "id": func["id"],
-                    "data": {"label": func["label"], "startLine": func.get("start_line"), "endLine": func.get("end_line")},
-                    "type": "function",
-                    "style": {"backgroundColor": NODE_COLORS["Function"]}
-                })
-        for cls in data.get("classes", []):
-            if cls.get("id"):
-                nodes.append({
-                    "id": cls["id"],
-                    "data": {"label": cls["label"], "startLine": cls.get("start_line"), "endLine": cls.get("end_line")},
-                    "type": "class",
-                    "style": {"backgroundColor": NODE_COLORS["Class"]}
-                })
-
-    if edges_result:
-        data = edges_result[0]
-        for edge_type in ["repo_files", "file_functions", "file_classes", "class_methods", "function_calls"]:
-            for edge in data.get(edge_type, []):
-                if edge.get("source") and edge.get("target"):
-                    edges.append({
-                        "id": f"{edge['source']}-{edge['target']}",
-                        "source": edge["source"],
-                        "target": edge["target"],
-                        "type": edge.get("type", "default")
-                    })
+    return {"nodes": nodes, "edges": edges, "next_cursor": next_cursor}
 
-    return {"nodes": nodes, "edges": edges}
+
+async def get_file_graph(neo4j: Neo4jClient, repo_id: str, path: str,
+                         cursor: Optional[str] = None, max_nodes: Optional[int] = None) -> dict:
+    """The functions and classes of one file, paged in node id order, with the
+    HAS_METHOD and CALLS edges between elements on the page."""
+    return await neo4j.read_transaction(_read_file_graph, neo4j, repo_id, path, cursor, max_nodes)
 
 
-async def search_nodes(neo4j: Neo4jClient, repo_id: str, query: str) -> list:
-    search_query = """
-    MATCH (n)
-    WHERE n.repo_id = $repo_id 
-    AND (n.name CONTAINS $query OR n.path CONTAINS $query)
-    RETURN n.name as name, labels(n)[0] as type, n.file_path as file_path,
-           n.start_line as start_line, n.end_line as end_line
-    LIMIT 50
+async def _read_file_graph(neo4j: Neo4jClient, repo_id: str, path: str,
+                           cursor: Optional[str], max_nodes: Optional[int]) -> dict:
+    limit = clamp_page_size(max_nodes)
+    rows = await neo4j.execute_query(FILE_ELEMENTS_QUERY, {
+        "repo_id": repo_id, "path": path, "after": decode_cursor(cursor), "limit": limit + 1
+    })
+    next_cursor = encode_cursor(rows[limit - 1]["id"]) if len(rows) > limit else None
+    rows = rows[:limit]
+    
+    nodes = []
+    for row in rows:
+        node_type = row["label_type"]
+        if node_type in ("Function", "Class") and row["id"]:
+            nodes.append(_element_node(row, node_type.lower(), NODE_COLORS[node_type]))
+    
+    ids = [node["id"] for node in nodes]
+    on_page = set(ids)
+    edges = [_edge(path, node_id, "CONTAINS") for node_id in ids]
+    if ids:
+        for row in await neo4j.execute_query(FILE_ELEMENT_EDGES_QUERY, {
+            "repo_id": repo_id, "path": path, "ids": ids
+        }):
+            if row["target"] in on_page:
+                edges.append(_edge(row["source"], row["target"], row["type"]))
+    
+    return {"nodes": nodes, "edges": edges, "next_cursor": next_cursor}
+
+
+SEARCH_QUERY = """
+CALL db.index.fulltext.queryNodes($index, $lucene, {limit: $candidates}) YIELD node, score
+WHERE node.repo_id = $repo_id
+  AND ($labels IS NULL OR any(label IN labels(node) WHERE label IN $labels))
+RETURN coalesce(node.name, node.path) as name, labels(node)[0] as type,
+       coalesce(node.file_path, node.path) as file_path,
+       node.start_line as start_line, node.end_line as end_line, score
+ORDER BY score DESC
+LIMIT $limit
+"""
+
+SEARCH_TERM = re.compile(r"[\w.]+")
+LUCENE_SPECIAL = re.compile(r'([+\-&|!(){}\[\]^"~*?:\\/])')
+SEARCHABLE_LABELS = {label.lower(): label for key, label in NODE_LABELS.items() if key != "REPO"}
+
+
+def _lucene_escape(text: str) -> str:
+    return LUCENE_SPECIAL.sub(r"\\\1", text)
+
+
+def build_search_query(repo_id: str, query: str) -> Optional[str]:
+    """Turn free text into a Lucene query scoped to one repo.
+
+    Every term must match a name or path: exact hits rank above prefix hits,
+    which rank above fuzzy (typo-tolerant) ones. Returns None if nothing is searchable.
     """
-    results = await neo4j.execute_query(search_query, {"repo_id": repo_id, "query": query})
+    clauses = []
+    for term in SEARCH_TERM.findall(query.lower()):
+        term = _lucene_escape(term)
+        options = [f"name:{term}^4", f"name:{term}*^2", f"path:{term}*"]
+        if len(term) >= 4:
+            options.append(f"name:{term}~1")
+        clauses.append(f"+({' OR '.join(options)})")
+    if not clauses:
+        return None
+    return f'+repo_id:"{_lucene_escape(repo_id)}" ' + " ".join(clauses)
+
+
+def parse_search_types(types: Optional[str]) -> Optional[list]:
+    """Map a comma-separated type filter ("function,class") to node labels."""
+    if not types:
+        return None
+    labels = []
+    for name in types.split(","):
+        name = name.strip().lower()
+        if not name:
+            continue
+        if name not in SEARCHABLE_LABELS:
+            raise ValueError(f"Unknown node type: {name}")
+        labels.append(SEARCHABLE_LABELS[name])
+    return labels or None
+
+
+def clamp_search_limit(limit: Optional[int]) -> int:
+    return max(1, min(limit or SEARCH_DEFAULT_LIMIT, SEARCH_MAX_LIMIT))
+
+
+async def search_nodes(neo4j: Neo4jClient, repo_id: str, query: str,
+                       types: Optional[str] = None, limit: Optional[int] = None) -> list:
+    lucene = build_search_query(repo_id, query)
+    if lucene is None:
+        return []
+    labels = parse_search_types(types)
+    limit = clamp_search_limit(limit)
+    # A type filter is applied after Lucene ranks, so pull in extra candidates for it
+    candidates = limit * 4 if labels else limit
+    results = await neo4j.execute_query(SEARCH_QUERY, {
+        "index": SEARCH_INDEX,
+        "lucene": lucene,
+        "repo_id": repo_id,
+        "labels": labels,
+        "candidates": candidates,
+        "limit": limit,
+    })
     return results
 
 
-async def get_node_by_id(neo4j: Neo4jClient, repo_id: str, node_id: str) -> dict:
-    query = """
-    MATCH (n {repo_id: $repo_id})
-    WHERE n.name + ':' + n.file_path = $node_id OR n.path = $node_id OR n.id = $node_id
-    RETURN n, labels(n)[0] as type
-    LIMIT 1
+# Codebase summary given to the chat model. Each list is read with a LIMIT, so the
+# cost is bounded by the sample size; only the counts touch every element
+CONTEXT_LIMITS = {"files": 50, "functions": 30, "classes": 20}
+
+CONTEXT_REPO_QUERY = """
+MATCH (r:Repo {id: $repo_id})
+RETURN r.name as repo_name, COUNT { (r)-[:HAS_FILE]->() } as file_count
+"""
+
+CONTEXT_FILES_QUERY = """
+MATCH (f:File {repo_id: $repo_id})
+RETURN f.path as path
+LIMIT $limit
+"""
+
+CONTEXT_ELEMENTS_QUERY = """
+MATCH (n:%s {repo_id: $repo_id})
+RETURN n.name as name, n.file_path as file
+LIMIT $limit
+"""
+
+CONTEXT_COUNT_QUERY = """
+MATCH (n:%s {repo_id: $repo_id})
+RETURN count(n) as count
+"""
+
+
+async def build_codebase_context(neo4j: Neo4jClient, repo_id: str) -> Optional[str]:
+    """Render the repo summary used as chat context, or None if the repo doesn't exist.
+
+    Computed once at the end of ingestion and stored on the Repo node.
     """
-    result = await neo4j.execute_query(query, {"repo_id": repo_id, "node_id": node_id})
+    params = {"repo_id": repo_id}
+    
+    async def read():
+        repo_result = await neo4j.execute_query(CONTEXT_REPO_QUERY, params)
+        if not repo_result:
+            return None
+        files = await neo4j.execute_query(CONTEXT_FILES_QUERY, {**params, "limit": CONTEXT_LIMITS["files"]})
+        sections = []
+        for label, title, key in (("Function", "Functions", "functions"), ("Class", "Classes", "classes")):
+            count = await neo4j.execute_query(CONTEXT_COUNT_QUERY % label, params)
+            rows = await neo4j.execute_query(
+                CONTEXT_ELEMENTS_QUERY % label, {**params, "limit": CONTEXT_LIMITS[key]}
+            )
+            sections.append((title, count[0]["count"], rows))
+        return repo_result, files, sections
+    
+    results = await neo4j.read_transaction(read)
+    if results is None:
+        return None
+    repo_result, files, sections = results
+    
+    context_parts = [
+        f"Repository: {repo_result[0]['repo_name'] or 'Unknown'}",
+        f"\nFiles ({repo_result[0]['file_count']}):",
+    ]
+    for row in files:
+        context_parts.append(f"  - {row['path']}")
+    
+    for title, count, rows in sections:
+        if count:
+            context_parts.append(f"\n{title} ({count}):")
+            for row in rows:
+                context_parts.append(f"  - {row['name']} in {row['file']}")
+    
+    return "\n".join(context_parts)
+
+
+# Chat retrieval: question terms matched against the symbol index, then expanded
+# one hop at a time over the code relationships from the matched nodes
+RETRIEVAL_STOP_WORDS = frozenset("""
+    a an and are as at be by can do does for from get how i in is it of on or set
+    that the this to use used uses what when where which who why with work works
+""".split())
+
+RETRIEVAL_SEED_QUERY = """
+CALL db.index.fulltext.queryNodes($index, $lucene, {limit: $limit}) YIELD node, score
+WHERE node.repo_id = $repo_id
+RETURN elementId(node) as element_id, labels(node)[0] as type,
+       coalesce(node.name, node.path) as name, coalesce(node.file_path, node.path) as file_path,
+       node.start_line as start_line, node.end_line as end_line, score
+"""
+
+RETRIEVAL_NEIGHBORS_QUERY = """
+UNWIND $element_ids AS source
+MATCH (n) WHERE elementId(n) = source
+CALL {
+    WITH n
+    MATCH (n)-[:CALLS|IMPORTS|CONTAINS|HAS_METHOD]-(m)
+    WHERE m.repo_id = $repo_id
+    RETURN DISTINCT m
+    LIMIT $fanout
+}
+RETURN source, elementId(m) as element_id, labels(m)[0] as type,
+       coalesce(m.name, m.path) as name, coalesce(m.file_path, m.path) as file_path,
+       m.start_line as start_line, m.end_line as end_line
+"""
+
+
+def build_retrieval_query(repo_id: str, question: str) -> Optional[str]:
+    """Like build_search_query, but for a question: any term may match, so the nodes
+    matching the most (and most exactly) rank first. Returns None if no term is left."""
+    clauses = []
+    for term in dict.fromkeys(SEARCH_TERM.findall(question.lower())):
+        term = term.strip(".")
+        if len(term) < 3 or term in RETRIEVAL_STOP_WORDS:
+            continue
+        term = _lucene_escape(term)
+        options = [f"name:{term}^4", f"name:{term}*^2", f"path:{term}*"]
+        if len(term) >= 5:
+            options.append(f"name:{term}~1")
+        clauses.append(f"({' OR '.join(options)})")
+    if not clauses:
+        return None
+    return f'+repo_id:"{_lucene_escape(repo_id)}" +({" ".join(clauses)})'
+
+
+async def find_seed_nodes(neo4j: Neo4jClient, repo_id: str, question: str, limit: int) -> list:
+    lucene = build_retrieval_query(repo_id, question)
+    if lucene is None:
+        return []
+    return await neo4j.execute_query(RETRIEVAL_SEED_QUERY, {
+        "index": SEARCH_INDEX,
+        "lucene": lucene,
+        "repo_id": repo_id,
+        "limit": limit,
+    })
+
+
+async def get_neighbors(neo4j: Neo4jClient, repo_id: str, element_ids: list[str], fanout: int) -> list:
+    """Up to fanout CALLS/IMPORTS/CONTAINS/HAS_METHOD neighbors of each node, in either direction."""
+    if not element_ids:
+        return []
+    return await neo4j.execute_query(RETRIEVAL_NEIGHBORS_QUERY, {
+        "element_ids": element_ids,
+        "repo_id": repo_id,
+        "fanout": fanout,
+    })
+
+
+# One (repo_id, node_id) index seek per label rather than an unlabeled scan
+NODE_BY_ID_QUERY = """
+CALL {
+    MATCH (n:Function {repo_id: $repo_id, node_id: $node_id}) RETURN n
+    UNION
+    MATCH (n:Class {repo_id: $repo_id, node_id: $node_id}) RETURN n
+    UNION
+    MATCH (n:File {repo_id: $repo_id, node_id: $node_id}) RETURN n
+    UNION
+    MATCH (n:Module {repo_id: $repo_id, node_id: $node_id}) RETURN n
+}
+RETURN n, labels(n)[0] as type
+LIMIT 1
+"""
+
+
+async def get_node_by_id(neo4j: Neo4jClient, repo_id: str, node_id: str) -> dict:
+    result = await neo4j.execute_query(NODE_BY_ID_QUERY, {"repo_id": repo_id, "node_id": node_id})
     if result:
         return result[0]
     return {}
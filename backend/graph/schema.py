@@ -1,3 +1,7 @@
+import logging
+
+logger = logging.getLogger(__name__)
+
 NODE_LABELS = {
     "REPO": "Repo",
     "FILE": "File",
@@ -17,8 +21,90 @@ RELATIONSHIP_TYPES = {
 
 NODE_COLORS = {
     "Repo": "#6366f1",
+    "Directory": "#0ea5e9",
     "File": "#22c55e",
     "Function": "#eab308",
     "Class": "#ef4444",
     "Module": "#8b5cf6",
 }
+
+# Uniqueness constraints mirror the MERGE keys used during ingestion; each one is
+# backed by an index, so MERGE and keyed MATCHes stop scanning whole labels.
+CONSTRAINTS = {
+    "repo_id": "CREATE CONSTRAINT repo_id IF NOT EXISTS FOR (r:Repo) REQUIRE r.id IS UNIQUE",
+    "file_key": "CREATE CONSTRAINT file_key IF NOT EXISTS FOR (f:File) REQUIRE (f.repo_id, f.path) IS UNIQUE",
+    "function_key": "CREATE CONSTRAINT function_key IF NOT EXISTS FOR (fn:Function) REQUIRE (fn.repo_id, fn.file_path, fn.name) IS UNIQUE",
+    "class_key": "CREATE CONSTRAINT class_key IF NOT EXISTS FOR (c:Class) REQUIRE (c.repo_id, c.file_path, c.name) IS UNIQUE",
+    "module_key": "CREATE CONSTRAINT module_key IF NOT EXISTS FOR (m:Module) REQUIRE (m.repo_id, m.name) IS UNIQUE",
+}
+
+# Lookups that only use part of a key: whole-repo reads and name-based call resolution
+INDEXES = {
+    "repo_url": "CREATE INDEX repo_url IF NOT EXISTS FOR (r:Repo) ON (r.url)",
+    "file_repo": "CREATE INDEX file_repo IF NOT EXISTS FOR (f:File) ON (f.repo_id)",
+    "function_repo": "CREATE INDEX function_repo IF NOT EXISTS FOR (fn:Function) ON (fn.repo_id)",
+    "function_name": "CREATE INDEX function_name IF NOT EXISTS FOR (fn:Function) ON (fn.repo_id, fn.name)",
+    "class_repo": "CREATE INDEX class_repo IF NOT EXISTS FOR (c:Class) ON (c.repo_id)",
+    "module_repo": "CREATE INDEX module_repo IF NOT EXISTS FOR (m:Module) ON (m.repo_id)",
+    "file_node_id": "CREATE INDEX file_node_id IF NOT EXISTS FOR (f:File) ON (f.repo_id, f.node_id)",
+    "function_node_id": "CREATE INDEX function_node_id IF NOT EXISTS FOR (fn:Function) ON (fn.repo_id, fn.node_id)",
+    "class_node_id": "CREATE INDEX class_node_id IF NOT EXISTS FOR (c:Class) ON (c.repo_id, c.node_id)",
+    "module_node_id": "CREATE INDEX module_node_id IF NOT EXISTS FOR (m:Module) ON (m.repo_id, m.node_id)",
+}
+
+# Canonical node_id per label, in the format the graph API emits. Ingestion writes
+# it directly; backfill_node_ids derives it for graphs ingested before it existed.
+NODE_ID_EXPRESSIONS = {
+    "File": "n.path",
+    "Function": "n.name + ':' + n.file_path",
+    "Class": "n.name + ':' + n.file_path",
+    "Module": "n.name",
+}
+
+NODE_ID_BACKFILL_BATCH = 10000
+
+# Lucene index behind /search: names and paths are ranked with prefix and fuzzy
+# matching, and repo_id is indexed too so the repo filter runs inside Lucene
+SEARCH_INDEX = "code_search"
+
+FULLTEXT_INDEXES = {
+    SEARCH_INDEX: (
+        f"CREATE FULLTEXT INDEX {SEARCH_INDEX} IF NOT EXISTS "
+        "FOR (n:File|Function|Class|Module) ON EACH [n.name, n.path, n.repo_id]"
+    ),
+}
+
+
+async def ensure_schema(neo4j) -> list[str]:
+    """Create any missing constraints and indexes; safe to run on every startup.
+
+    Returns the names of the statements that failed (e.g. a uniqueness constraint
+    over data that already holds duplicates) so the rest still get applied.
+    """
+    failed = []
+    async with neo4j.session():
+        for name, statement in {**CONSTRAINTS, **INDEXES, **FULLTEXT_INDEXES}.items():
+            try:
+                await neo4j.execute_write(statement)
+            except Exception as e:
+                logger.warning(f"Failed to create schema element {name}: {e}")
+                failed.append(name)
+    return failed
+
+
+async def backfill_node_ids(neo4j) -> int:
+    """Set node_id on nodes written before ingestion stored it; a no-op once migrated.
+
+    Runs in batched transactions so large graphs don't need one huge commit.
+    """
+    updated = 0
+    for label, expression in NODE_ID_EXPRESSIONS.items():
+        query = f"""
+        MATCH (n:{label}) WHERE n.node_id IS NULL
+        CALL {{ WITH n SET n.node_id = {expression} }} IN TRANSACTIONS OF {NODE_ID_BACKFILL_BATCH} ROWS
+        """
+        counters = await neo4j.execute_write(query)
+        updated += counters.properties_set
+    if updated:
+        logger.info(f"Backfilled node_id on {updated} nodes")
+    return updated
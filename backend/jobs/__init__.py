@@ -0,0 +1,7 @@
+from jobs.manager import AnalysisJob, JobManager, job_manager
+
+__all__ = [
+    "AnalysisJob",
+    "JobManager",
+    "job_manager",
+]
@@ -0,0 +1,173 @@
+import uuid
+import asyncio
+import logging
+from datetime import datetime, timezone
+from collections import OrderedDict
+from typing import AsyncIterator, Optional
+
+from config import MAX_CONCURRENT_ANALYSES, JOB_QUEUE_SIZE, JOB_HISTORY_SIZE
+
+logger = logging.getLogger(__name__)
+
+FINISHED_STATUSES = ("completed", "failed")
+
+
+class AnalysisJob:
+    def __init__(self, github_url: str, incremental: bool):
+        self.job_id = uuid.uuid4().hex[:12]
+        self.github_url = github_url
+        self.incremental = incremental
+        self.status = "queued"
+        self.phase = "queued"
+        self.files_total = 0
+        self.files_parsed = 0
+        self.files_written = 0
+        self.repo_id: Optional[str] = None
+        self.node_count = 0
+        self.cache_hit = False
+        self.error: Optional[str] = None
+        self.created_at = datetime.now(timezone.utc)
+        self.finished_at: Optional[datetime] = None
+        self.version = 0
+        self._changed = asyncio.Event()
+
+    @property
+    def finished(self) -> bool:
+        return self.status in FINISHED_STATUSES
+
+    def update(self, **fields):
+        """Apply progress fields and wake everyone watching this job."""
+        for name, value in fields.items():
+            setattr(self, name, value)
+        self.version += 1
+        # Swap in a fresh event so watchers that already woke don't spin on a set one
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+    async def wait_for_change(self, version: int, timeout: float):
+        if self.version != version:
+            return
+        await asyncio.wait_for(self._changed.wait(), timeout)
+
+    def to_dict(self) -> dict:
+        return {
+            "job_id": self.job_id,
+            "github_url": self.github_url,
+            "status": self.status,
+            "phase": self.phase,
+            "files_total": self.files_total,
+            "files_parsed": self.files_parsed,
+            "files_written": self.files_written,
+            "repo_id": self.repo_id,
+            "node_count": self.node_count,
+            "cache_hit": self.cache_hit,
+            "error": self.error,
+            "created_at": self.created_at.isoformat(),
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+        }
+
+
+class JobManager:
+    """Queue of repository analyses drained by a fixed number of worker tasks.
+
+    max_concurrent caps how many analyses run at once, so one huge repository can
+    hold at most one worker while the rest of the queue keeps moving.
+    """
+
+    def __init__(self, max_concurrent: int = MAX_CONCURRENT_ANALYSES,
+                 queue_size: int = JOB_QUEUE_SIZE, history_size: int = JOB_HISTORY_SIZE):
+        self._max_concurrent = max_concurrent
+        self._queue_size = queue_size
+        self._history_size = history_size
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: list[asyncio.Task] = []
+        self._jobs: OrderedDict[str, AnalysisJob] = OrderedDict()
+
+    def start(self):
+        if self._workers:
+            return
+        self._queue = asyncio.Queue(maxsize=self._queue_size)
+        self._workers = [
+            asyncio.ensure_future(self._worker(i)) for i in range(self._max_concurrent)
+        ]
+        logger.info(f"Started {self._max_concurrent} analysis workers")
+
+    async def shutdown(self):
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    def submit(self, github_url: str, incremental: bool = True) -> AnalysisJob:
+        """Queue an analysis; raises asyncio.QueueFull when the backlog is at capacity."""
+        self.start()
+        job = AnalysisJob(github_url, incremental)
+        self._queue.put_nowait(job)
+        self._jobs[job.job_id] = job
+        self._trim_history()
+        return job
+
+    def get(self, job_id: str) -> Optional[AnalysisJob]:
+        return self._jobs.get(job_id)
+
+    async def watch(self, job_id: str, heartbeat: float = 15.0) -> AsyncIterator[Optional[dict]]:
+        """Yield the job's state on every change until it finishes; None marks an idle heartbeat."""
+        job = self._jobs[job_id]
+        version = -1
+        while True:
+            if job.version != version:
+                version = job.version
+                yield job.to_dict()
+                if job.finished:
+                    return
+            try:
+                await job.wait_for_change(version, heartbeat)
+            except asyncio.TimeoutError:
+                yield None
+
+    async def _worker(self, index: int):
+        while True:
+            job = await self._queue.get()
+            try:
+                await self._run(job)
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job: AnalysisJob):
+        from ai.gemini import response_cache
+        from graph.neo4j_client import Neo4jClient
+        from parsers.analysis_cache import analysis_cache
+
+        job.update(status="running", phase="resolving")
+        try:
+            result, cache_hit = await analysis_cache.analyze(
+                job.github_url, Neo4jClient(), incremental=job.incremental, progress=job.update
+            )
+            if not cache_hit:
+                # Answers about the previous analysis no longer describe the repo
+                await response_cache.invalidate_repo(result["repo_id"])
+            job.update(
+                status="completed",
+                phase="completed",
+                repo_id=result["repo_id"],
+                node_count=result["node_count"],
+                cache_hit=cache_hit,
+                finished_at=datetime.now(timezone.utc),
+            )
+        except Exception as e:
+            logger.error(f"Analysis job {job.job_id} failed: {e}")
+            job.update(
+                status="failed",
+                phase="failed",
+                error=str(e),
+                finished_at=datetime.now(timezone.utc),
+            )
+
+    def _trim_history(self):
+        # Only finished jobs are evicted; queued and running ones stay reachable
+        excess = len(self._jobs) - self._history_size
+        for job_id in [jid for jid, job in self._jobs.items() if job.finished][:max(excess, 0)]:
+            del self._jobs[job_id]
+
+
+job_manager = JobManager()
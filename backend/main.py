@@ -2,19 +2,48 @@ import sys
 import os
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, HTTPException
+from fastapi.responses import StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from typing import Optional
+import asyncio
+import json
 import logging
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    from graph.neo4j_client import Neo4jClient
+    from graph.schema import ensure_schema, backfill_node_ids
+    
+    try:
+        neo4j = Neo4jClient()
+        await neo4j.connect()
+        await ensure_schema(neo4j)
+        await backfill_node_ids(neo4j)
+    except Exception as e:
+        logger.warning(f"Skipping graph schema bootstrap: {e}")
+    yield
+    from content.store import content_store
+    from jobs.manager import job_manager
+    from parsers.parallel import shutdown_parse_pool
+    await job_manager.shutdown()
+    shutdown_parse_pool()
+    content_store.close()
+    if Neo4jClient._instance is not None:
+        await Neo4jClient._instance.close()
+
+
 app = FastAPI(
     title="CodeViz AI",
     description="AI-powered codebase visualization and understanding platform",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 app.add_middleware(
@@ -33,12 +62,28 @@ class HealthResponse(BaseModel):
 
 class AnalyzeRequest(BaseModel):
     github_url: str
+    incremental: bool = True
 
 
 class AnalyzeResponse(BaseModel):
-    repo_id: str
+    job_id: str
     status: str
+
+
+class JobResponse(BaseModel):
+    job_id: str
+    github_url: str
+    status: str
+    phase: str
+    files_total: int
+    files_parsed: int
+    files_written: int
+    repo_id: Optional[str] = None
     node_count: int
+    cache_hit: bool
+    error: Optional[str] = None
+    created_at: str
+    finished_at: Optional[str] = None
 
 
 class ChatRequest(BaseModel):
@@ -56,22 +101,62 @@ async def health_check():
     return HealthResponse(status="healthy", version="1.0.0")
 
 
-@app.post("/analyze", response_model=AnalyzeResponse)
-async def analyze_repository(request: AnalyzeRequest):
-    from parsers.treesitter import parse_repository
+@app.get("/metrics")
+async def get_metrics():
+    from ai.gemini import GeminiClient, response_cache
     from graph.neo4j_client import Neo4jClient
+    from parsers.clones import mirror_pool
+    
+    client = Neo4jClient._instance
+    gemini = GeminiClient._instance
+    return {
+        "neo4j_pool": client.metrics.to_dict() if client else None,
+        "gemini": gemini.metrics.to_dict() if gemini else None,
+        "llm_cache": response_cache.to_dict(),
+        "clone_mirrors": mirror_pool.to_dict(),
+    }
+
+
+@app.post("/analyze", response_model=AnalyzeResponse, status_code=202)
+async def analyze_repository(request: AnalyzeRequest):
+    from jobs.manager import job_manager
     
     try:
-        neo4j = Neo4jClient()
-        repo_id, nodes = await parse_repository(request.github_url, neo4j)
-        return AnalyzeResponse(
-            repo_id=repo_id,
-            status="completed",
-            node_count=len(nodes)
-        )
-    except Exception as e:
-        logger.error(f"Analysis failed: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
+        job = job_manager.submit(request.github_url, incremental=request.incremental)
+        return AnalyzeResponse(job_id=job.job_id, status=job.status)
+    except asyncio.QueueFull:
+        raise HTTPException(status_code=503, detail="Too many analyses queued, try again later")
+
+
+@app.get("/jobs/{job_id}", response_model=JobResponse)
+async def get_job(job_id: str):
+    from jobs.manager import job_manager
+    
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return JobResponse(**job.to_dict())
+
+
+@app.get("/jobs/{job_id}/events")
+async def stream_job(job_id: str):
+    from jobs.manager import job_manager
+    
+    if job_manager.get(job_id) is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    async def events():
+        async for state in job_manager.watch(job_id):
+            if state is None:
+                yield ": keep-alive\n\n"
+            else:
+                yield f"data: {json.dumps(state)}\n\n"
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 
 @app.get("/graph/{repo_id}")
@@ -88,6 +173,38 @@ async def get_graph(repo_id: str):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.get("/graph/{repo_id}/level")
+async def get_graph_level(repo_id: str, path: str = "", cursor: Optional[str] = None,
+                          max_nodes: Optional[int] = None):
+    from graph.neo4j_client import Neo4jClient
+    from graph.queries import get_graph_level
+    
+    try:
+        neo4j = Neo4jClient()
+        return await get_graph_level(neo4j, repo_id, path, cursor, max_nodes)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Failed to fetch graph level: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/graph/{repo_id}/file")
+async def get_file_graph(repo_id: str, path: str, cursor: Optional[str] = None,
+                         max_nodes: Optional[int] = None):
+    from graph.neo4j_client import Neo4jClient
+    from graph.queries import get_file_graph
+    
+    try:
+        neo4j = Neo4jClient()
+        return await get_file_graph(neo4j, repo_id, path, cursor, max_nodes)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Failed to fetch file graph: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @app.post("/chat", response_model=ChatResponse)
 async def chat_with_codebase(request: ChatRequest):
     from ai.gemini import GeminiClient
@@ -122,15 +239,83 @@ async def explain_code(repo_id: str, node_id: str):
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@app.get("/search")
-async def search_codebase(repo_id: str, query: str):
+@app.get("/code")
+async def get_code(repo_id: str, path: str, start_line: int = 1, end_line: Optional[int] = None):
+    from content.store import content_store
+    
+    code = await content_store.get_lines(repo_id, path, start_line, end_line)
+    if code is None:
+        raise HTTPException(status_code=404, detail="File not found")
+    return {"path": path, "start_line": max(start_line, 1), "code": code}
+
+
+def event_stream(events) -> StreamingResponse:
+    """Serve an async iterator of dicts as server-sent events; a failure mid-stream
+    becomes a final "error" event since the response status is already sent."""
+    async def body():
+        try:
+            async for event in events:
+                yield f"data: {json.dumps(event)}\n\n"
+        except Exception as e:
+            logger.error(f"Stream failed: {e}")
+            yield f"data: {json.dumps({'type': 'error', 'detail': str(e)})}\n\n"
+    
+    return StreamingResponse(
+        body(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@app.post("/chat/stream")
+async def stream_chat(request: ChatRequest):
+    from ai.gemini import GeminiClient
     from graph.neo4j_client import Neo4jClient
-    from graph.queries import search_nodes
     
     try:
         neo4j = Neo4jClient()
-        results = await search_nodes(neo4j, repo_id, query)
+        gemini = GeminiClient()
+    except Exception as e:
+        logger.error(f"Chat failed: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+    return event_stream(gemini.stream_answer(request.repo_id, request.message, neo4j))
+
+
+@app.get("/explain/stream")
+async def stream_explanation(repo_id: str, node_id: str):
+    from ai.gemini import GeminiClient
+    from graph.neo4j_client import Neo4jClient
+    
+    try:
+        neo4j = Neo4jClient()
+        gemini = GeminiClient()
+    except Exception as e:
+        logger.error(f"Explain failed: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+    return event_stream(gemini.stream_explanation(repo_id, node_id, neo4j))
+
+
+@app.get("/search")
+async def search_codebase(repo_id: str, query: str, types: Optional[str] = None,
+                          limit: Optional[int] = None, mode: str = "text"):
+    from graph.neo4j_client import Neo4jClient
+    from graph.queries import search_nodes, parse_search_types, clamp_search_limit
+    from search.embeddings import embedding_index
+    
+    if mode not in ("text", "semantic"):
+        raise HTTPException(status_code=400, detail=f"Unknown search mode: {mode}")
+    try:
+        if mode == "semantic":
+            # Answered from the local vector index alone: no graph query, no Gemini call
+            results = await embedding_index.search(
+                repo_id, query, parse_search_types(types), clamp_search_limit(limit)
+            )
+        else:
+            neo4j = Neo4jClient()
+            results = await search_nodes(neo4j, repo_id, query, types, limit)
         return {"results": results}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Search failed: {e}")
         raise HTTPException(status_code=500, detail=str(e))
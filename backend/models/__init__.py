@@ -8,6 +8,7 @@ from models.schemas import (
     GraphData,
     AnalyzeRequest,
     AnalyzeResponse,
+    JobResponse,
     ChatRequest,
     ChatResponse,
     ExplainResponse,
@@ -25,6 +26,7 @@ __all__ = [
     "GraphData",
     "AnalyzeRequest",
     "AnalyzeResponse",
+    "JobResponse",
     "ChatRequest",
     "ChatResponse",
     "ExplainResponse",
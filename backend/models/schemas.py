@@ -58,12 +58,28 @@ class GraphData(BaseModel):
 
 class AnalyzeRequest(BaseModel):
     github_url: str = Field(..., description="GitHub repository URL")
+    incremental: bool = Field(True, description="Reuse a previous analysis of this URL and re-parse only changed files")
 
 
 class AnalyzeResponse(BaseModel):
-    repo_id: str
+    job_id: str
+    status: str
+
+
+class JobResponse(BaseModel):
+    job_id: str
+    github_url: str
     status: str
-    node_count: int
+    phase: str
+    files_total: int = 0
+    files_parsed: int = 0
+    files_written: int = 0
+    repo_id: Optional[str] = None
+    node_count: int = 0
+    cache_hit: bool = False
+    error: Optional[str] = None
+    created_at: str
+    finished_at: Optional[str] = None
 
 
 class ChatRequest(BaseModel):
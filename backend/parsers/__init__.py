@@ -1,10 +1,14 @@
-from parsers.treesitter import parse_repository, parse_file, collect_files
+from parsers.treesitter import parse_repository, parse_file, collect_files, iter_files
+from parsers.parallel import parse_files, shutdown_parse_pool
 from parsers.languages import get_language_config, get_supported_languages
 
 __all__ = [
     "parse_repository",
     "parse_file",
     "collect_files",
+    "iter_files",
+    "parse_files",
+    "shutdown_parse_pool",
     "get_language_config",
     "get_supported_languages",
 ]
@@ -0,0 +1,105 @@
+import asyncio
+import logging
+import weakref
+from collections import OrderedDict
+from typing import Callable, Optional
+
+from config import ANALYSIS_CACHE_SIZE
+from graph.neo4j_client import Neo4jClient
+from parsers.treesitter import normalize_repo_url, resolve_head_sha, parse_repository
+
+logger = logging.getLogger(__name__)
+
+
+class AnalysisCache:
+    """Completed analyses keyed by (normalized URL, HEAD commit SHA).
+
+    Lookups go to a small in-process LRU first and then to the commit recorded on
+    the Repo node. Concurrent requests for the same key share a single analysis task,
+    and every caller's progress callback receives that task's updates, starting with
+    the progress so far for a caller that joins late. Analyses of
+    one URL at different commits (or unresolved ones) write to the same repo_id, so
+    they run one after another rather than interleaving their writes.
+    """
+
+    def __init__(self, max_entries: int = ANALYSIS_CACHE_SIZE):
+        self._max_entries = max_entries
+        self._completed: OrderedDict[tuple[str, str], dict] = OrderedDict()
+        # key -> (task, progress listeners, latest value of every progress field)
+        self._in_flight: dict[tuple[str, str], tuple[asyncio.Task, list, dict]] = {}
+        # Held by whichever analysis of the URL is running; dropped once nobody waits on it
+        self._url_locks: "weakref.WeakValueDictionary[str, asyncio.Lock]" = weakref.WeakValueDictionary()
+
+    async def analyze(self, github_url: str, neo4j: Neo4jClient, incremental: bool = True,
+                      progress: Optional[Callable[..., None]] = None) -> tuple[dict, bool]:
+        """Return ({"repo_id", "node_count"}, cache_hit) for the repository's current HEAD."""
+        url = normalize_repo_url(github_url)
+        loop = asyncio.get_event_loop()
+        commit_sha = await loop.run_in_executor(None, resolve_head_sha, url)
+        listeners = [progress] if progress else []
+        snapshot = {}
+
+        # A forced full analysis, or a remote we couldn't resolve, always runs
+        if not incremental or commit_sha is None:
+            return await self._run(url, None, neo4j, incremental, listeners, snapshot), False
+
+        key = (url, commit_sha)
+        cached = await self._lookup(key, neo4j)
+        if cached:
+            return cached, True
+
+        if key in self._in_flight:
+            task, shared_listeners, shared_snapshot = self._in_flight[key]
+            logger.info(f"Joining in-flight analysis of {url}@{commit_sha[:12]}")
+            # Replay what was reported before joining (phase, files_total, ...)
+            if shared_snapshot:
+                for listener in listeners:
+                    listener(**shared_snapshot)
+            shared_listeners.extend(listeners)
+            return await asyncio.shield(task), True
+
+        task = asyncio.ensure_future(self._run(url, commit_sha, neo4j, incremental, listeners, snapshot))
+        self._in_flight[key] = (task, listeners, snapshot)
+        task.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        return await asyncio.shield(task), False
+
+    async def _lookup(self, key: tuple[str, str], neo4j: Neo4jClient) -> Optional[dict]:
+        if key in self._completed:
+            self._completed.move_to_end(key)
+            return self._completed[key]
+
+        stored = await neo4j.find_analysis(*key)
+        if stored:
+            self._remember(key, stored)
+        return stored
+
+    async def _run(self, url: str, commit_sha: Optional[str], neo4j: Neo4jClient,
+                   incremental: bool, listeners: list, snapshot: dict) -> dict:
+        def progress(**fields):
+            snapshot.update(fields)
+            for listener in listeners:
+                listener(**fields)
+
+        lock = self._url_locks.get(url)
+        if lock is None:
+            lock = self._url_locks[url] = asyncio.Lock()
+        async with lock:
+            # The analysis that held the lock may have just produced this commit
+            cached = await self._lookup((url, commit_sha), neo4j) if incremental and commit_sha else None
+            if cached:
+                return cached
+            analysis = await parse_repository(url, neo4j, incremental=incremental, progress=progress)
+            result = {"repo_id": analysis["repo_id"], "node_count": analysis["node_count"]}
+            self._remember((url, analysis["commit_sha"]), result)
+        return result
+
+    def _remember(self, key: tuple[str, str], result: dict):
+        # An incremental run moves a repo_id to a new commit, so older keys pointing at it are stale
+        for stale in [k for k, v in self._completed.items() if v["repo_id"] == result["repo_id"]]:
+            del self._completed[stale]
+        self._completed[key] = result
+        while len(self._completed) > self._max_entries:
+            self._completed.popitem(last=False)
+
+
+analysis_cache = AnalysisCache()
@@ -0,0 +1,148 @@
+import asyncio
+import logging
+import posixpath
+from typing import Optional
+
+from graph.neo4j_client import Neo4jClient
+
+logger = logging.getLogger(__name__)
+
+SOURCE_EXTENSIONS = (".py", ".js", ".jsx", ".mjs", ".ts", ".tsx")
+PACKAGE_ENTRY_FILES = ("__init__", "index")
+
+
+def _strip_extension(path: str) -> str:
+    stem, ext = posixpath.splitext(path)
+    return stem if ext in SOURCE_EXTENSIONS else path
+
+
+def _module_key(path: str) -> str:
+    """The import path a file answers to: its path without extension, and a package
+    entry file (__init__.py, index.ts) answers for its directory."""
+    stem = _strip_extension(path)
+    if posixpath.basename(stem) in PACKAGE_ENTRY_FILES:
+        stem = posixpath.dirname(stem)
+    return stem
+
+
+class CallGraph:
+    """In-memory symbol table for a whole repo that resolves call names to functions.
+
+    Files are added as they are parsed (or loaded back from the graph when unchanged),
+    each with its functions, the names every function calls, and its imports. resolve()
+    then links a call to a function named like the callee, trying in order:
+
+    1. a function defined in a file the caller's file imports
+    2. a function in the caller's own file
+    3. the only function with that name anywhere in the repo
+
+    A tier with several candidates is ambiguous and the call stays unresolved, so
+    common names (get, run, ...) don't fan out into bogus edges.
+    """
+
+    def __init__(self, files: list[dict]):
+        self._languages = {file_info["path"]: file_info["language"] for file_info in files}
+        # Every trailing run of path segments maps to the files it could name, so both
+        # package imports ("graph.queries") and aliased ones ("@/lib/api") find their file
+        self._modules: dict[str, list[str]] = {}
+        for path in self._languages:
+            parts = _module_key(path).split("/")
+            for start in range(len(parts)):
+                self._modules.setdefault("/".join(parts[start:]), []).append(path)
+
+        self._functions_by_file: dict[str, set] = {}
+        self._files_by_function: dict[str, list[str]] = {}
+        self._calls: dict[str, list[tuple[str, list[str]]]] = {}
+        self._imports: dict[str, list[str]] = {}
+
+    def add_file(self, path: str, functions: list[dict], imports: list[str]):
+        names = self._functions_by_file.setdefault(path, set())
+        calls = self._calls.setdefault(path, [])
+        for func in functions:
+            if func["name"] not in names:
+                names.add(func["name"])
+                self._files_by_function.setdefault(func["name"], []).append(path)
+            if func.get("calls"):
+                calls.append((func["name"], func["calls"]))
+        self._imports[path] = imports
+
+    def _module_files(self, importer: str, spec: str) -> list[str]:
+        if self._languages.get(importer) == "python":
+            key = spec.lstrip(".").replace(".", "/")
+        elif spec.startswith("."):
+            key = posixpath.normpath(posixpath.join(posixpath.dirname(importer), spec))
+        else:
+            key = spec[2:] if spec.startswith(("@/", "~/")) else spec
+        return self._modules.get(_module_key(key), [])
+
+    def _imported_files(self, path: str) -> set:
+        imported = set()
+        for spec in self._imports.get(path, []):
+            imported.update(self._module_files(path, spec))
+        imported.discard(path)
+        return imported
+
+    def _resolve(self, callee: str, path: str, imported: set) -> Optional[str]:
+        defined_in = self._files_by_function.get(callee)
+        if not defined_in:
+            return None
+
+        candidates = [file for file in imported if callee in self._functions_by_file.get(file, ())]
+        if candidates:
+            return candidates[0] if len(candidates) == 1 else None
+        if callee in self._functions_by_file.get(path, ()):
+            return path
+        if len(defined_in) == 1:
+            return defined_in[0]
+        return None
+
+    def resolve(self) -> set[tuple[str, str]]:
+        """Return every resolved call as a (caller node_id, callee node_id) pair."""
+        edges = set()
+        for path, functions in self._calls.items():
+            imported = self._imported_files(path)
+            resolved = {}
+            for name, calls in functions:
+                for callee in calls:
+                    if callee not in resolved:
+                        resolved[callee] = self._resolve(callee, path, imported)
+                    target_file = resolved[callee]
+                    if target_file:
+                        # Same format as the Function node_id written at ingestion
+                        edges.add((f"{name}:{path}", f"{callee}:{target_file}"))
+        return edges
+
+
+def _diff_calls(call_graph: CallGraph, stored: set[tuple[str, str]]) -> tuple[set, list[dict], list[dict]]:
+    edges = call_graph.resolve()
+    stale = [{"source": source, "target": target} for source, target in stored - edges]
+    added = [{"source": source, "target": target} for source, target in edges - stored]
+    return edges, stale, added
+
+
+async def write_call_graph(neo4j: Neo4jClient, repo_id: str, call_graph: CallGraph,
+                           unchanged_paths: list[str], existing: bool) -> int:
+    """Resolve the repo's calls and bring its CALLS edges in line with them.
+
+    Files skipped by an incremental run are loaded back from the graph first, since
+    a changed file can change what their calls resolve to. Only the difference from
+    the stored edges is written. Returns the number of resolved edges.
+    """
+    if unchanged_paths:
+        for row in await neo4j.get_file_symbols(repo_id, unchanged_paths):
+            call_graph.add_file(row["path"], row["functions"], row["imports"])
+    stored = await neo4j.get_call_relationships(repo_id) if existing else set()
+
+    # Resolving every call site is pure CPU: keep it off the event loop and don't
+    # hold a pooled session while it runs
+    loop = asyncio.get_event_loop()
+    edges, stale, added = await loop.run_in_executor(None, _diff_calls, call_graph, stored)
+
+    async with neo4j.session():
+        if stale:
+            await neo4j.delete_call_relationships(repo_id, stale)
+        if added:
+            await neo4j.create_call_relationships(repo_id, added)
+
+    logger.info(f"Resolved {len(edges)} calls ({len(added)} added, {len(stale)} removed)")
+    return len(edges)
@@ -0,0 +1,232 @@
+import os
+import stat
+import uuid
+import shutil
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from git.cmd import Git
+from git.exc import GitCommandError
+
+from config import TEMP_CLONE_DIR, CLONE_MIRROR_DIR, CLONE_MIRROR_MAX_MB
+
+logger = logging.getLogger(__name__)
+
+# Where the fetched HEAD of the remote is kept in a mirror
+HEAD_REF = "refs/codeviz/head"
+
+
+def remove_readonly(func, path, excinfo):
+    """Error handler for shutil.rmtree to handle read-only files on Windows"""
+    os.chmod(path, stat.S_IWRITE)
+    func(path)
+
+
+def _dir_size(path: str) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.lstat(os.path.join(root, name)).st_size
+            except OSError:
+                pass
+    return total
+
+
+class MirrorPool:
+    """Shallow bare mirrors of analyzed repositories, reused across analyses.
+
+    The first analysis of a URL fetches its HEAD at depth 1 into a bare mirror;
+    later ones fetch into the same mirror, so only the objects that changed since
+    come over the wire. An analysis either reads the fetched commit straight from
+    the mirror (fetch() / release_mirror()) or gets its own detached worktree of it
+    (checkout() / release()). A fetch that moves the tip leaves the previous tip's
+    objects in place for analyses still reading them; they are pruned once the last
+    holder releases the mirror. Mirrors are evicted least recently used first once
+    they take more than CLONE_MIRROR_MAX_MB, never while held.
+    """
+
+    def __init__(self, root: str, max_bytes: int):
+        self._root = os.path.abspath(root)
+        self._max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._mirror_locks: dict[str, threading.Lock] = {}
+        # mirror path -> size in bytes, least recently used first; None until scanned
+        self._sizes: "OrderedDict[str, int] | None" = None
+        self._in_use: dict[str, int] = {}
+        # Mirrors whose tip moved while held; pruned when the last holder lets go
+        self._stale: set[str] = set()
+        self._checkouts: dict[str, str] = {}
+
+    def _mirror_path(self, url: str) -> str:
+        return os.path.join(self._root, hashlib.sha256(url.encode()).hexdigest()[:16] + ".git")
+
+    def _mirror_lock(self, mirror: str) -> threading.Lock:
+        with self._lock:
+            return self._mirror_locks.setdefault(mirror, threading.Lock())
+
+    def _scan(self):
+        # Called with self._lock held; mirrors left by a previous run count toward the limit
+        if self._sizes is not None:
+            return
+        os.makedirs(self._root, exist_ok=True)
+        mirrors = [os.path.join(self._root, name) for name in os.listdir(self._root) if name.endswith(".git")]
+        mirrors.sort(key=os.path.getmtime)
+        self._sizes = OrderedDict((mirror, _dir_size(mirror)) for mirror in mirrors)
+
+    def _fetch(self, url: str, mirror: str) -> tuple[str, bool]:
+        """Fetch url's HEAD into the mirror; returns (commit sha, whether the tip moved)."""
+        if not os.path.isdir(mirror):
+            logger.info(f"Creating mirror of {url}")
+            Git().init("--bare", "--quiet", mirror)
+            Git(mirror).remote("add", "origin", url)
+        else:
+            logger.info(f"Updating mirror of {url}")
+        git = Git(mirror)
+        try:
+            previous_sha = git.rev_parse("--verify", "--quiet", HEAD_REF)
+        except GitCommandError:
+            previous_sha = None
+        # Not blobless (--filter=blob:none): every file of the commit is read right
+        # after the fetch, and in a partial clone each missing blob is its own
+        # round trip to the remote instead of one pack. No auto gc either: it could
+        # drop the previous tip while an analysis is still reading it.
+        git.fetch("--depth=1", "--no-tags", "--no-auto-gc", "--quiet", "origin", f"+HEAD:{HEAD_REF}")
+        commit_sha = git.rev_parse(HEAD_REF)
+        return commit_sha, previous_sha is not None and previous_sha != commit_sha
+
+    @staticmethod
+    def _is_intact(url: str, mirror: str) -> bool:
+        """Whether the mirror is a complete repository of url, i.e. a failed fetch wasn't its fault."""
+        git = Git(mirror)
+        try:
+            if git.config("--get", "remote.origin.url") != url:
+                return False
+            git.fsck("--connectivity-only", "--no-dangling")
+        except GitCommandError:
+            return False
+        return True
+
+    def _prune(self, mirror: str):
+        """Drop objects no longer reachable from the mirror's tip or its worktrees, once nothing holds it."""
+        with self._mirror_lock(mirror):
+            with self._lock:
+                if self._in_use.get(mirror) or mirror not in self._stale or mirror not in self._sizes:
+                    return
+                self._stale.discard(mirror)
+            try:
+                Git(mirror).gc("--prune=now", "--quiet")
+            except GitCommandError as e:
+                logger.warning(f"Failed to prune {mirror}: {e}")
+                return
+            size = _dir_size(mirror)
+        with self._lock:
+            if mirror in self._sizes:
+                self._sizes[mirror] = size
+
+    def fetch(self, url: str) -> tuple[str, str]:
+        """Bring url's mirror up to date and hold it; returns (mirror path, commit sha).
+
+        The mirror is not evicted until the matching release_mirror() call.
+        """
+        mirror = self._mirror_path(url)
+        with self._lock:
+            self._scan()
+            self._in_use[mirror] = self._in_use.get(mirror, 0) + 1
+
+        try:
+            with self._mirror_lock(mirror):
+                try:
+                    commit_sha, moved = self._fetch(url, mirror)
+                except GitCommandError as e:
+                    # A network or auth failure leaves an intact mirror; one held by
+                    # other analyses is never deleted under them
+                    with self._lock:
+                        shared = self._in_use[mirror] > 1
+                    if shared or self._is_intact(url, mirror):
+                        raise
+                    # A broken mirror is cheaper to rebuild than to repair
+                    logger.warning(f"Mirror of {url} is broken, recreating it: {e}")
+                    shutil.rmtree(mirror, onerror=remove_readonly)
+                    commit_sha, moved = self._fetch(url, mirror)
+                size = _dir_size(mirror)
+        except Exception:
+            self.release_mirror(mirror)
+            raise
+
+        with self._lock:
+            self._sizes[mirror] = size
+            self._sizes.move_to_end(mirror)
+            if moved:
+                self._stale.add(mirror)
+            self._evict()
+        os.utime(mirror)
+        return mirror, commit_sha
+
+    def release_mirror(self, mirror: str):
+        with self._lock:
+            self._in_use[mirror] -= 1
+            self._evict()
+            prune = not self._in_use[mirror] and mirror in self._stale
+        if prune:
+            self._prune(mirror)
+
+    def checkout(self, url: str) -> tuple[str, str]:
+        """Fetch url into its mirror and check the fetched HEAD out; returns (worktree path, commit sha)."""
+        mirror, commit_sha = self.fetch(url)
+        try:
+            worktree = os.path.abspath(os.path.join(TEMP_CLONE_DIR, str(uuid.uuid4())[:8]))
+            os.makedirs(TEMP_CLONE_DIR, exist_ok=True)
+            with self._mirror_lock(mirror):
+                Git(mirror).worktree("add", "--detach", "--quiet", worktree, commit_sha)
+        except Exception:
+            self.release_mirror(mirror)
+            raise
+
+        with self._lock:
+            self._checkouts[worktree] = mirror
+        return worktree, commit_sha
+
+    def release(self, worktree: str):
+        """Delete a worktree made by checkout() and let its mirror be evicted again."""
+        with self._lock:
+            mirror = self._checkouts.pop(worktree, None)
+        if os.path.exists(worktree):
+            shutil.rmtree(worktree, onerror=remove_readonly)
+        if mirror is None:
+            return
+        with self._mirror_lock(mirror):
+            try:
+                Git(mirror).worktree("prune")
+            except GitCommandError as e:
+                logger.warning(f"Failed to prune worktrees of {mirror}: {e}")
+        self.release_mirror(mirror)
+
+    def _evict(self):
+        # Called with self._lock held
+        total = sum(self._sizes.values())
+        for mirror in list(self._sizes):
+            if total <= self._max_bytes:
+                break
+            if self._in_use.get(mirror):
+                continue
+            total -= self._sizes.pop(mirror)
+            self._mirror_locks.pop(mirror, None)
+            self._stale.discard(mirror)
+            logger.info(f"Evicting mirror {mirror}")
+            shutil.rmtree(mirror, onerror=remove_readonly)
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            sizes = self._sizes or {}
+            return {
+                "mirrors": len(sizes),
+                "size_mb": round(sum(sizes.values()) / 2 ** 20, 1),
+                "max_mb": round(self._max_bytes / 2 ** 20, 1),
+                "in_use": sum(1 for count in self._in_use.values() if count),
+                "checked_out": len(self._checkouts),
+            }
+
+
+mirror_pool = MirrorPool(CLONE_MIRROR_DIR, CLONE_MIRROR_MAX_MB * 2 ** 20)
@@ -0,0 +1,71 @@
+import threading
+from typing import Iterator
+
+from git.cmd import Git
+
+from config import MAX_FILE_SIZE_BYTES, MAX_FILES_PER_REPO
+from parsers.treesitter import SKIPPED_DIRS, get_language_from_extension
+
+# ls-tree modes that aren't regular file content: symlinks and submodule commits
+SKIPPED_MODES = ("120000", "160000")
+
+
+def iter_tree_files(git_dir: str, commit_sha: str) -> Iterator[dict]:
+    """Yield descriptors for every parseable file in a commit's tree, straight from git.
+
+    The same files iter_files finds in a checkout, filtered on the path and the
+    size ls-tree reports, so no content is read here. Each descriptor carries the
+    file's blob_sha, which doubles as its content hash.
+    """
+    listing = Git(git_dir).ls_tree("-r", "-l", "-z", commit_sha)
+    count = 0
+
+    for entry in listing.split("\0"):
+        if not entry:
+            continue
+        meta, path = entry.split("\t", 1)
+        mode, object_type, blob_sha, size = meta.split()
+        if object_type != "blob" or mode in SKIPPED_MODES:
+            continue
+
+        directories = path.split("/")[:-1]
+        if any(d.startswith(".") or d in SKIPPED_DIRS for d in directories):
+            continue
+        language = get_language_from_extension(path)
+        if not language or int(size) > MAX_FILE_SIZE_BYTES:
+            continue
+
+        yield {
+            "path": path,
+            "language": language,
+            "size": int(size),
+            "blob_sha": blob_sha,
+        }
+        count += 1
+        if count >= MAX_FILES_PER_REPO:
+            return
+
+
+def collect_tree_files(git_dir: str, commit_sha: str) -> list[dict]:
+    return list(iter_tree_files(git_dir, commit_sha))
+
+
+class GitObjectReader:
+    """Blob contents out of a repository's object database.
+
+    Reads go through one long-lived `git cat-file --batch` process, so a blob costs
+    a pipe round trip instead of a process start or a file on disk. The process
+    answers one request at a time, hence the lock.
+    """
+
+    def __init__(self, git_dir: str):
+        self._git = Git(git_dir)
+        self._lock = threading.Lock()
+
+    def read(self, blob_sha: str) -> bytes:
+        with self._lock:
+            return self._git.get_object_data(blob_sha)[3]
+
+    def close(self):
+        with self._lock:
+            self._git.clear_cache()
@@ -1,3 +1,5 @@
+QUERY_KEYS = ("function_query", "class_query", "import_query", "call_query")
+
 LANGUAGE_CONFIGS = {
     "python": {
         "extension": ".py",
@@ -130,3 +132,15 @@ def get_language_config(language: str) -> dict:
 
 def get_supported_languages() -> list[str]:
     return list(LANGUAGE_CONFIGS.keys())
+
+
+def get_combined_query(language: str) -> str:
+    """One query holding every extraction pattern, so a file's tree is walked once.
+
+    A language may set its own "combined_query"; otherwise the per-kind queries are
+    concatenated. Capture names stay prefixed by kind, which is how matches are dispatched.
+    """
+    config = get_language_config(language)
+    if config.get("combined_query"):
+        return config["combined_query"]
+    return "\n".join(config[key] for key in QUERY_KEYS if config.get(key))
@@ -0,0 +1,120 @@
+import os
+import asyncio
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import AsyncIterator, Iterable, Optional
+
+from config import PARSE_WORKERS, PARSE_TASKS_PER_WORKER
+from parsers.gitobjects import GitObjectReader
+from parsers.treesitter import init_parsers, load_and_parse
+
+logger = logging.getLogger(__name__)
+
+# What a file that could not be read or parsed contributes: its File node and nothing else
+EMPTY_RESULT = {"functions": [], "classes": [], "imports": [], "calls": []}
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_workers = 0
+
+
+def _init_worker():
+    """Build the tree-sitter parsers once per worker process instead of once per task."""
+    init_parsers()
+
+
+def get_worker_count() -> int:
+    return PARSE_WORKERS if PARSE_WORKERS > 0 else (os.cpu_count() or 1)
+
+
+def get_parse_pool() -> ProcessPoolExecutor:
+    global _pool, _pool_workers
+    if _pool is None:
+        _pool_workers = get_worker_count()
+        # spawn rather than fork: the server process holds driver and executor threads
+        _pool = ProcessPoolExecutor(
+            max_workers=_pool_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+        )
+        logger.info(f"Started parse pool with {_pool_workers} workers")
+    return _pool
+
+
+def shutdown_parse_pool():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+async def parse_files(files: Iterable[dict], reader: Optional[GitObjectReader] = None
+                      ) -> AsyncIterator[tuple[dict, Optional[dict]]]:
+    """Read and parse files across the process pool, yielding (file_info, parsed) as each finishes.
+
+    Results arrive in completion order, not input order, with file_info["hash"] filled in
+    and file_info["blob"] holding the compressed content when load_and_parse produced it.
+    parsed is None only when the file matched its known_hash. A file that could not be
+    read or parsed comes back with EMPTY_RESULT, an empty "hash" and the failure in
+    "error". Only PARSE_TASKS_PER_WORKER files per worker are in flight, and file content
+    is never kept in file_info, so memory is bounded by that depth rather than by the
+    repository size.
+
+    Files listed from git (carrying a blob_sha) are read through reader and handed to
+    the worker with their content; one whose blob_sha is its known_hash isn't read at all.
+    Other files are read from disk by the worker itself.
+    """
+    loop = asyncio.get_running_loop()
+    pool = get_parse_pool()
+    max_in_flight = _pool_workers * PARSE_TASKS_PER_WORKER
+    pending = {}
+    files_iter = iter(files)
+
+    async def load(file_info: dict) -> dict:
+        blob_sha = file_info.get("blob_sha")
+        if blob_sha is None:
+            return await loop.run_in_executor(pool, load_and_parse, file_info)
+        if blob_sha == file_info.get("known_hash") and not file_info.get("store_blob"):
+            return {"hash": blob_sha, "parsed": None, "blob": None}
+        content = await loop.run_in_executor(None, reader.read, blob_sha)
+        return await loop.run_in_executor(pool, load_and_parse, {**file_info, "content": content})
+
+    def submit_next() -> bool:
+        file_info = next(files_iter, None)
+        if file_info is None:
+            return False
+        pending[asyncio.ensure_future(load(file_info))] = file_info
+        return True
+
+    while len(pending) < max_in_flight and submit_next():
+        pass
+
+    try:
+        while pending:
+            done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for future in done:
+                file_info = pending.pop(future)
+                parsed = None
+                try:
+                    result = future.result()
+                    file_info["hash"] = result["hash"]
+                    file_info["blob"] = result["blob"]
+                    parsed = result["parsed"]
+                except BrokenProcessPool:
+                    raise
+                except Exception as e:
+                    logger.warning(f"Failed to parse {file_info['path']}: {e}")
+                    file_info["error"] = str(e)
+                    # An empty hash never matches, so the next analysis retries the file
+                    file_info["hash"] = ""
+                    parsed = EMPTY_RESULT
+                submit_next()
+                yield file_info, parsed
+    except BrokenProcessPool:
+        logger.error("Parse pool worker died, restarting pool on next use")
+        shutdown_parse_pool()
+        raise
+    finally:
+        for future in pending:
+            future.cancel()
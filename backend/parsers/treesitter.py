@@ -1,30 +1,39 @@
 import os
 import hashlib
 import uuid
-import shutil
-import stat
 import logging
 from pathlib import Path
-from typing import Optional
+from typing import Callable, Iterator, Optional
 from git import Repo as GitRepo
+from git.cmd import Git
 import tree_sitter_python
 import tree_sitter_javascript
 import tree_sitter_typescript
-from tree_sitter import Language, Parser
+from tree_sitter import Language, Parser, Query
 
-from config import TEMP_CLONE_DIR, SUPPORTED_LANGUAGES, MAX_FILE_SIZE_BYTES, MAX_FILES_PER_REPO
+try:
+    from tree_sitter import QueryCursor
+except ImportError:  # tree-sitter < 0.25 runs queries directly
+    QueryCursor = None
+
+from config import (
+    SUPPORTED_LANGUAGES, MAX_FILE_SIZE_BYTES, MAX_FILES_PER_REPO,
+    INGEST_FLUSH_FILES, COLLECT_FROM_GIT,
+)
+from content.store import compress_lines, content_store
 from graph.neo4j_client import Neo4jClient
-from parsers.languages import get_language_config
+from graph.queries import build_codebase_context
+from parsers.clones import mirror_pool
+from parsers.languages import LANGUAGE_CONFIGS, get_combined_query
+from search.embeddings import embed_symbols, embedding_index
 
 logger = logging.getLogger(__name__)
 
 
-def remove_readonly(func, path, excinfo):
-    """Error handler for shutil.rmtree to handle read-only files on Windows"""
-    os.chmod(path, stat.S_IWRITE)
-    func(path)
-
 PARSERS = {}
+QUERIES = {}
+
+QUERY_KINDS = ("function", "class", "import", "call")
 
 
 def init_parsers():
@@ -43,6 +52,30 @@ def init_parsers():
         "javascript": {"parser": js_parser, "language": js_lang},
         "typescript": {"parser": ts_parser, "language": ts_lang},
     }
+    compile_queries()
+
+
+def compile_queries():
+    """Compile every query in LANGUAGE_CONFIGS once per language for this process."""
+    global QUERIES
+    
+    compiled = {}
+    for language, parser_info in PARSERS.items():
+        config = LANGUAGE_CONFIGS.get(language, {})
+        compiled[language] = {}
+        for kind in QUERY_KINDS:
+            query_str = config.get(f"{kind}_query", "")
+            if not query_str:
+                continue
+            try:
+                compiled[language][kind] = Query(parser_info["language"], query_str)
+            except Exception as e:
+                logger.warning(f"Failed to compile {kind} query for {language}: {e}")
+        try:
+            compiled[language]["combined"] = Query(parser_info["language"], get_combined_query(language))
+        except Exception as e:
+            logger.warning(f"Failed to compile combined query for {language}: {e}")
+    QUERIES = compiled
 
 
 def get_parser(language: str):
@@ -51,6 +84,26 @@ def get_parser(language: str):
     return PARSERS.get(language)
 
 
+def get_query(language: str, kind: str) -> Optional[Query]:
+    if not PARSERS:
+        init_parsers()
+    return QUERIES.get(language, {}).get(kind)
+
+
+def run_query(query: Query, root) -> list[tuple[int, dict]]:
+    """Return (pattern_index, {capture_name: [nodes]}) for every match under root."""
+    if QueryCursor is not None:
+        return QueryCursor(query).matches(root)
+    return query.matches(root)
+
+
+def normalize_repo_url(github_url: str) -> str:
+    url = github_url.strip().rstrip("/")
+    if url.endswith(".git"):
+        url = url[:-4]
+    return url
+
+
 def extract_repo_name(github_url: str) -> str:
     url = github_url.rstrip("/")
     if url.endswith(".git"):
@@ -60,83 +113,140 @@ def extract_repo_name(github_url: str) -> str:
 
 
 def clone_repository(github_url: str) -> tuple[str, str]:
+    """Check out the repository's HEAD from its mirror; release the path with release_clone."""
     repo_id = str(uuid.uuid4())[:8]
-    repo_name = extract_repo_name(github_url)
-    clone_path = os.path.join(TEMP_CLONE_DIR, repo_id)
-    
-    os.makedirs(TEMP_CLONE_DIR, exist_ok=True)
-    
-    logger.info(f"Cloning {github_url} to {clone_path}")
-    GitRepo.clone_from(github_url, clone_path, depth=1)
-    
+    clone_path, commit_sha = mirror_pool.checkout(github_url)
+    logger.info(f"Checked out {github_url} at {commit_sha[:12]} to {clone_path}")
     return repo_id, clone_path
 
 
+def release_clone(clone_path: str):
+    mirror_pool.release(clone_path)
+
+
+def resolve_head_sha(github_url: str) -> Optional[str]:
+    """Ask the remote for its HEAD commit without cloning."""
+    try:
+        line = Git().ls_remote(github_url, "HEAD").split("\n")[0]
+        return line.split()[0] if line else None
+    except Exception as e:
+        logger.warning(f"Failed to resolve HEAD of {github_url}: {e}")
+        return None
+
+
+def get_head_sha(clone_path: str) -> str:
+    return GitRepo(clone_path).head.commit.hexsha
+
+
 def get_file_hash(content: bytes) -> str:
     return hashlib.sha256(content).hexdigest()[:16]
 
 
+def get_repo_content_hash(file_hashes: dict[str, str]) -> str:
+    """Digest of every file path and content hash; changes whenever any file does."""
+    digest = hashlib.sha256()
+    for path in sorted(file_hashes):
+        digest.update(f"{path}\0{file_hashes[path]}\n".encode())
+    return digest.hexdigest()[:16]
+
+
 def get_language_from_extension(file_path: str) -> Optional[str]:
     ext = os.path.splitext(file_path)[1]
     return SUPPORTED_LANGUAGES.get(ext)
 
 
-def collect_files(repo_path: str) -> list[dict]:
-    files = []
+SKIPPED_DIRS = ("node_modules", "__pycache__")
+
+
+def iter_files(repo_path: str) -> Iterator[dict]:
+    """Lazily yield descriptors for every parseable file, without reading any content.
+
+    Files over MAX_FILE_SIZE_BYTES are skipped and at most MAX_FILES_PER_REPO are yielded.
+    """
     count = 0
     
     for root, dirs, filenames in os.walk(repo_path):
-        dirs[:] = [d for d in dirs if not d.startswith(".") and d != "node_modules" and d != "__pycache__"]
+        dirs[:] = [d for d in dirs if not d.startswith(".") and d not in SKIPPED_DIRS]
         
         for filename in filenames:
-            if count >= MAX_FILES_PER_REPO:
-                break
-                
-            file_path = os.path.join(root, filename)
-            rel_path = os.path.relpath(file_path, repo_path)
             language = get_language_from_extension(filename)
-            
             if not language:
                 continue
                 
+            file_path = os.path.join(root, filename)
             try:
                 size = os.path.getsize(file_path)
-                if size > MAX_FILE_SIZE_BYTES:
-                    continue
-                    
-                with open(file_path, "rb") as f:
-                    content = f.read()
-                
-                files.append({
-                    "path": rel_path,
-                    "full_path": file_path,
-                    "language": language,
-                    "size": size,
-                    "hash": get_file_hash(content),
-                    "content": content.decode("utf-8", errors="ignore")
-                })
-                count += 1
-            except Exception as e:
-                logger.warning(f"Failed to read {file_path}: {e}")
-                
-    return files
+            except OSError as e:
+                logger.warning(f"Failed to stat {file_path}: {e}")
+                continue
+            if size > MAX_FILE_SIZE_BYTES:
+                continue
+            
+            yield {
+                "path": os.path.relpath(file_path, repo_path),
+                "full_path": file_path,
+                "language": language,
+                "size": size,
+            }
+            count += 1
+            if count >= MAX_FILES_PER_REPO:
+                return
+
+
+def collect_files(repo_path: str) -> list[dict]:
+    return list(iter_files(repo_path))
+
+
+def load_and_parse(file_info: dict) -> dict:
+    """Hash and parse one file from its raw bytes; only the compressed content is returned.
+
+    The bytes are file_info["content"] when the caller read them (from git), else the
+    file at full_path. A file from git is hashed by its blob_sha.
+
+    If file_info carries a known_hash equal to the file's current hash the parse
+    is skipped and "parsed" is None. "blob" holds the compressed content for the
+    content store whenever the file changed or file_info asks for it with store_blob.
+    A parsed file also carries "vectors", the embeddings of its functions then classes.
+    """
+    content = file_info.get("content")
+    if content is None:
+        with open(file_info["full_path"], "rb") as f:
+            content = f.read()
+    
+    content_hash = file_info.get("blob_sha") or get_file_hash(content)
+    if content_hash == file_info.get("known_hash"):
+        blob = compress_lines(content) if file_info.get("store_blob") else None
+        return {"hash": content_hash, "parsed": None, "blob": blob}
+    
+    parsed = parse_file({"language": file_info["language"], "content": content})
+    parsed["vectors"] = embed_symbols(parsed, file_info["path"], content)
+    return {"hash": content_hash, "parsed": parsed, "blob": compress_lines(content)}
 
 
 def parse_file(file_info: dict) -> dict:
+    """Parse file_info["content"], the file's raw bytes.
+
+    Tree-sitter works on the bytes directly and only the captured spans are decoded,
+    so node byte offsets always line up with the content they index.
+    """
     language = file_info["language"]
     content = file_info["content"]
+    if isinstance(content, str):
+        content = content.encode()
     parser_info = get_parser(language)
     
     if not parser_info:
         return {"functions": [], "classes": [], "imports": [], "calls": []}
     
     parser = parser_info["parser"]
-    lang = parser_info["language"]
-    config = get_language_config(language)
     
-    tree = parser.parse(content.encode())
+    tree = parser.parse(content)
     root = tree.root_node
     
+    combined = get_query(language, "combined")
+    if combined is not None:
+        return extract_all(root, content, combined)
+    
     result = {
         "functions": [],
         "classes": [],
@@ -144,177 +254,422 @@ def parse_file(file_info: dict) -> dict:
         "calls": []
     }
     
-    result["functions"] = extract_functions(root, content, lang, config)
-    result["classes"] = extract_classes(root, content, lang, config)
-    result["imports"] = extract_imports(root, content, lang, config)
-    result["calls"] = extract_calls(root, content, lang, config)
+    result["functions"] = extract_functions(root, content, get_query(language, "function"))
+    result["classes"] = extract_classes(root, content, get_query(language, "class"))
+    result["imports"] = extract_imports(root, content, get_query(language, "import"))
+    call_sites = extract_call_sites(root, content, get_query(language, "call"))
+    result["calls"] = list(dict.fromkeys(name for _, name in call_sites))
+    attribute_calls(result["functions"], call_sites)
+    attribute_methods(result["classes"], result["functions"])
     
     return result
 
 
-def extract_functions(root, content: str, lang, config: dict) -> list[dict]:
+def _node_text(node, content: bytes) -> str:
+    return content[node.start_byte:node.end_byte].decode("utf-8", errors="ignore")
+
+
+def _function_from_match(captures: dict, content: bytes) -> Optional[dict]:
+    name_nodes = captures.get("function.name")
+    if not name_nodes:
+        return None
+    def_node = captures["function.def"][0]
+    params = captures.get("function.params")
+    return_type = captures.get("function.return_type")
+    return {
+        "name": _node_text(name_nodes[0], content),
+        "params": _node_text(params[0], content) if params else "()",
+        "return_type": _node_text(return_type[0], content) if return_type else "",
+        "start_line": def_node.start_point[0] + 1,
+        "end_line": def_node.end_point[0] + 1,
+        "start_byte": def_node.start_byte,
+        "end_byte": def_node.end_byte,
+    }
+
+
+def _class_from_match(captures: dict, content: bytes) -> Optional[dict]:
+    name_nodes = captures.get("class.name")
+    if not name_nodes:
+        return None
+    def_node = captures["class.def"][0]
+    return {
+        "name": _node_text(name_nodes[0], content),
+        "start_line": def_node.start_point[0] + 1,
+        "end_line": def_node.end_point[0] + 1,
+        "start_byte": def_node.start_byte,
+        "end_byte": def_node.end_byte,
+    }
+
+
+def _add_imports_from_match(imports: list[str], seen: set, captures: dict, content: bytes):
+    for capture_name, nodes in captures.items():
+        if not capture_name.startswith("import."):
+            continue
+        for node in nodes:
+            import_text = _node_text(node, content).strip("'\"")
+            if import_text and import_text not in seen:
+                seen.add(import_text)
+                imports.append(import_text)
+
+
+def _add_calls_from_match(call_sites: list[tuple[int, str]], captures: dict, content: bytes):
+    for node in captures.get("call.name", []):
+        call_name = _node_text(node, content)
+        if call_name:
+            call_sites.append((node.start_byte, call_name))
+
+
+def attribute_calls(functions: list[dict], call_sites: list[tuple[int, str]]):
+    """Set each function's "calls" to the distinct names called directly in its body.
+
+    A call site belongs to the innermost function whose byte range contains it.
+    Function ranges nest like the syntax tree, so one sweep over both lists sorted
+    by offset, with a stack of the open functions, attributes every call.
+    """
+    for func in functions:
+        func["calls"] = []
+    order = sorted(functions, key=lambda func: (func["start_byte"], -func["end_byte"]))
+    seen = {id(func): set() for func in functions}
+    stack = []
+    next_func = 0
+    
+    for offset, name in sorted(call_sites):
+        while next_func < len(order) and order[next_func]["start_byte"] <= offset:
+            func = order[next_func]
+            while stack and stack[-1]["end_byte"] <= func["start_byte"]:
+                stack.pop()
+            stack.append(func)
+            next_func += 1
+        while stack and stack[-1]["end_byte"] <= offset:
+            stack.pop()
+        if stack and name not in seen[id(stack[-1])]:
+            seen[id(stack[-1])].add(name)
+            stack[-1]["calls"].append(name)
+
+
+def attribute_methods(classes: list[dict], functions: list[dict]):
+    """Set "class" on every function whose closest enclosing definition is a class.
+
+    Same sweep as attribute_calls: definitions sorted by byte range, with a stack
+    of the ones still open. A function nested inside a method is not a method.
+    """
+    definitions = [(cls["start_byte"], -cls["end_byte"], cls, True) for cls in classes]
+    definitions += [(func["start_byte"], -func["end_byte"], func, False) for func in functions]
+    definitions.sort(key=lambda item: (item[0], item[1]))
+    stack = []
+    
+    for start, _, definition, is_class in definitions:
+        while stack and stack[-1][0]["end_byte"] <= start:
+            stack.pop()
+        if not is_class:
+            parent = stack[-1] if stack else None
+            definition["class"] = parent[0]["name"] if parent and parent[1] else None
+        stack.append((definition, is_class))
+
+
+def extract_all(root, content: bytes, query: Query) -> dict:
+    """Single walk over the tree with the combined query, dispatching each match by capture name.
+
+    Produces the same result as running extract_functions, extract_classes,
+    extract_imports and extract_call_sites one after another.
+    """
+    result = {"functions": [], "classes": [], "imports": [], "calls": []}
+    seen_imports = set()
+    call_sites = []
+    
+    try:
+        for _, captures in run_query(query, root):
+            if "function.def" in captures:
+                func = _function_from_match(captures, content)
+                if func:
+                    result["functions"].append(func)
+            elif "class.def" in captures:
+                cls = _class_from_match(captures, content)
+                if cls:
+                    result["classes"].append(cls)
+            elif "call.name" in captures:
+                _add_calls_from_match(call_sites, captures, content)
+            else:
+                _add_imports_from_match(result["imports"], seen_imports, captures, content)
+    except Exception as e:
+        logger.warning(f"Failed to extract from combined query: {e}")
+    
+    result["calls"] = list(dict.fromkeys(name for _, name in call_sites))
+    attribute_calls(result["functions"], call_sites)
+    attribute_methods(result["classes"], result["functions"])
+    return result
+
+
+def extract_functions(root, content: bytes, query: Optional[Query]) -> list[dict]:
     functions = []
-    query_str = config.get("function_query", "")
-    if not query_str:
+    if query is None:
         return functions
         
     try:
-        query = lang.query(query_str)
-        captures = query.captures(root)
-        
-        current_func = {}
-        for node, name in captures:
-            if name == "function.name":
-                current_func["name"] = content[node.start_byte:node.end_byte]
-            elif name == "function.params":
-                current_func["params"] = content[node.start_byte:node.end_byte]
-            elif name == "function.return_type":
-                current_func["return_type"] = content[node.start_byte:node.end_byte]
-            elif name == "function.def":
-                current_func["start_line"] = node.start_point[0] + 1
-                current_func["end_line"] = node.end_point[0] + 1
-                if current_func.get("name"):
-                    functions.append({
-                        "name": current_func.get("name", "anonymous"),
-                        "params": current_func.get("params", "()"),
-                        "return_type": current_func.get("return_type", ""),
-                        "start_line": current_func["start_line"],
-                        "end_line": current_func["end_line"]
-                    })
-                current_func = {}
+        for _, captures in run_query(query, root):
+            func = _function_from_match(captures, content)
+            if func:
+                functions.append(func)
     except Exception as e:
         logger.warning(f"Failed to extract functions: {e}")
         
     return functions
 
 
-def extract_classes(root, content: str, lang, config: dict) -> list[dict]:
+def extract_classes(root, content: bytes, query: Optional[Query]) -> list[dict]:
     classes = []
-    query_str = config.get("class_query", "")
-    if not query_str:
+    if query is None:
         return classes
         
     try:
-        query = lang.query(query_str)
-        captures = query.captures(root)
-        
-        current_class = {}
-        for node, name in captures:
-            if name == "class.name":
-                current_class["name"] = content[node.start_byte:node.end_byte]
-            elif name == "class.def":
-                current_class["start_line"] = node.start_point[0] + 1
-                current_class["end_line"] = node.end_point[0] + 1
-                if current_class.get("name"):
-                    classes.append({
-                        "name": current_class["name"],
-                        "start_line": current_class["start_line"],
-                        "end_line": current_class["end_line"]
-                    })
-                current_class = {}
+        for _, captures in run_query(query, root):
+            cls = _class_from_match(captures, content)
+            if cls:
+                classes.append(cls)
     except Exception as e:
         logger.warning(f"Failed to extract classes: {e}")
         
     return classes
 
 
-def extract_imports(root, content: str, lang, config: dict) -> list[str]:
+def extract_imports(root, content: bytes, query: Optional[Query]) -> list[str]:
     imports = []
-    query_str = config.get("import_query", "")
-    if not query_str:
+    if query is None:
         return imports
         
     try:
-        query = lang.query(query_str)
-        captures = query.captures(root)
-        
-        for node, name in captures:
-            import_text = content[node.start_byte:node.end_byte]
-            import_text = import_text.strip("'\"")
-            if import_text and import_text not in imports:
-                imports.append(import_text)
+        seen = set()
+        for _, captures in run_query(query, root):
+            _add_imports_from_match(imports, seen, captures, content)
     except Exception as e:
         logger.warning(f"Failed to extract imports: {e}")
         
     return imports
 
 
-def extract_calls(root, content: str, lang, config: dict) -> list[str]:
-    calls = []
-    query_str = config.get("call_query", "")
-    if not query_str:
-        return calls
+def extract_call_sites(root, content: bytes, query: Optional[Query]) -> list[tuple[int, str]]:
+    """Every call in the file as (byte offset, callee name)."""
+    call_sites = []
+    if query is None:
+        return call_sites
         
     try:
-        query = lang.query(query_str)
-        captures = query.captures(root)
-        
-        for node, name in captures:
-            if name == "call.name":
-                call_name = content[node.start_byte:node.end_byte]
-                if call_name and call_name not in calls:
-                    calls.append(call_name)
+        for _, captures in run_query(query, root):
+            _add_calls_from_match(call_sites, captures, content)
     except Exception as e:
         logger.warning(f"Failed to extract calls: {e}")
         
-    return calls
+    return call_sites
+
+
+def extract_calls(root, content: bytes, query: Optional[Query]) -> list[str]:
+    return list(dict.fromkeys(name for _, name in extract_call_sites(root, content, query)))
 
 
-async def parse_repository(github_url: str, neo4j: Neo4jClient) -> tuple[str, list]:
+def new_ingest_batch() -> dict:
+    return {"files": [], "functions": [], "classes": [], "imports": [], "methods": [], "changed_files": []}
+
+
+def add_to_batch(batch: dict, file_info: dict, parsed: dict, changed: bool = False) -> list[dict]:
+    """Append the graph rows for one parsed file and return the nodes it produced.
+
+    changed marks a file already in the graph whose previous contents must be pruned.
+    """
+    path = file_info["path"]
+    nodes = [{"type": "file", "path": path}]
+
+    if changed:
+        batch["changed_files"].append({
+            "path": path,
+            "functions": [func["name"] for func in parsed["functions"]],
+            "classes": [cls["name"] for cls in parsed["classes"]],
+        })
+
+    batch["files"].append({
+        "path": path,
+        "language": file_info["language"],
+        "size": file_info["size"],
+        "hash": file_info["hash"],
+    })
+
+    # Same-named functions in one file share a graph node, so they share its calls too
+    calls_by_name = {}
+    for func in parsed["functions"]:
+        calls_by_name.setdefault(func["name"], {}).update(dict.fromkeys(func.get("calls", [])))
+
+    for func in parsed["functions"]:
+        batch["functions"].append({
+            "file_path": path,
+            "name": func["name"],
+            "start_line": func["start_line"],
+            "end_line": func["end_line"],
+            "params": func["params"],
+            "return_type": func.get("return_type", ""),
+            "calls": list(calls_by_name[func["name"]]),
+        })
+        nodes.append({"type": "function", "name": func["name"]})
+        if func.get("class"):
+            batch["methods"].append({"file_path": path, "class_name": func["class"], "name": func["name"]})
+
+    for cls in parsed["classes"]:
+        batch["classes"].append({
+            "file_path": path,
+            "name": cls["name"],
+            "start_line": cls["start_line"],
+            "end_line": cls["end_line"],
+        })
+        nodes.append({"type": "class", "name": cls["name"]})
+
+    for imp in parsed["imports"]:
+        batch["imports"].append({"file_path": path, "module_name": imp})
+
+    return nodes
+
+
+def _symbol_rows(path: str, parsed: dict) -> list[dict]:
+    """Describe the rows of parsed["vectors"]: functions first, then classes."""
+    return [
+        {"type": node_type, "name": symbol["name"], "file_path": path,
+         "start_line": symbol["start_line"], "end_line": symbol["end_line"]}
+        for node_type, key in (("Function", "functions"), ("Class", "classes"))
+        for symbol in parsed[key]
+    ]
+
+
+def _no_progress(**fields):
+    pass
+
+
+async def parse_repository(github_url: str, neo4j: Neo4jClient, incremental: bool = True,
+                           progress: Callable[..., None] = _no_progress) -> dict:
+    """Clone, parse and write a repository to the graph.
+
+    Returns the repo_id, the analyzed commit_sha and the repo's total node_count.
+
+    In incremental mode a URL that was analyzed before keeps its repo_id: only files
+    whose content hash differs from the stored one are re-parsed, and files that
+    disappeared are deleted from the graph.
+
+    With COLLECT_FROM_GIT the files are listed and read from the mirror's object
+    database, nothing is checked out, and each file's blob SHA is its content hash.
+
+    progress is called with keyword fields (phase, files_total, files_parsed,
+    files_written) as the analysis moves along.
+    """
     import asyncio
+    from parsers.callgraph import CallGraph, write_call_graph
+    from parsers.gitobjects import GitObjectReader, collect_tree_files
+    from parsers.parallel import parse_files
     
+    github_url = normalize_repo_url(github_url)
     repo_name = extract_repo_name(github_url)
     loop = asyncio.get_event_loop()
-    repo_id, clone_path = await loop.run_in_executor(None, clone_repository, github_url)
+    
+    existing_repo_id = await neo4j.find_repo_by_url(github_url) if incremental else None
+    progress(phase="cloning")
+    reader = None
+    if COLLECT_FROM_GIT:
+        git_dir, commit_sha = await loop.run_in_executor(None, mirror_pool.fetch, github_url)
+        repo_id = str(uuid.uuid4())[:8]
+        reader = GitObjectReader(git_dir)
+    else:
+        repo_id, clone_path = await loop.run_in_executor(None, clone_repository, github_url)
+    repo_id = existing_repo_id or repo_id
     
     try:
         await neo4j.create_repo_node(repo_id, repo_name, github_url)
         
-        files = await loop.run_in_executor(None, collect_files, clone_path)
-        logger.info(f"Found {len(files)} files to parse")
+        progress(phase="collecting")
+        # Descriptors only: content is read, hashed and parsed inside the parse workers
+        if reader is not None:
+            files = await loop.run_in_executor(None, collect_tree_files, git_dir, commit_sha)
+        else:
+            files = await loop.run_in_executor(None, collect_files, clone_path)
+        stored_hashes = await neo4j.get_file_hashes(repo_id) if existing_repo_id else {}
+        # Embeddings come out of the parse, so without an index to carry rows over
+        # from, every file is parsed again (once) to build one
+        reembed = bool(stored_hashes) and not embedding_index.has_index(repo_id)
+        # Unchanged files still go to the content store if it lost their blob (or predates them)
+        missing_blobs = await content_store.missing_blobs(stored_hashes.values())
+        for file_info in files:
+            file_info["known_hash"] = None if reembed else stored_hashes.get(file_info["path"])
+            file_info["store_blob"] = file_info["known_hash"] in missing_blobs
+        
+        current_paths = {file_info["path"] for file_info in files}
+        removed = [path for path in stored_hashes if path not in current_paths]
+        logger.info(f"Found {len(files)} files, {len(removed)} removed since last analysis")
+        
+        if removed:
+            await neo4j.delete_file_nodes(repo_id, removed)
         
         all_nodes = []
+        call_graph = CallGraph(files)
+        unchanged_paths = []
+        file_hashes = {}
+        blobs = {}
+        symbols = []
+        vectors = []
+        batch = new_ingest_batch()
+        pending_files = 0
+        files_parsed = 0
+        files_unchanged = 0
+        progress(phase="parsing", files_total=len(files), files_parsed=0, files_written=0)
         
-        for file_info in files:
-            await neo4j.create_file_node(
-                repo_id,
-                file_info["path"],
-                file_info["language"],
-                file_info["size"],
-                file_info["hash"]
-            )
-            all_nodes.append({"type": "file", "path": file_info["path"]})
-            
-            parsed = await loop.run_in_executor(None, parse_file, file_info)
-            
-            for func in parsed["functions"]:
-                await neo4j.create_function_node(
-                    repo_id,
-                    file_info["path"],
-                    func["name"],
-                    func["start_line"],
-                    func["end_line"],
-                    func["params"],
-                    func.get("return_type", "")
-                )
-                all_nodes.append({"type": "function", "name": func["name"]})
-            
-            for cls in parsed["classes"]:
-                await neo4j.create_class_node(
-                    repo_id,
-                    file_info["path"],
-                    cls["name"],
-                    cls["start_line"],
-                    cls["end_line"]
-                )
-                all_nodes.append({"type": "class", "name": cls["name"]})
+        async for file_info, parsed in parse_files(files, reader):
+            files_parsed += 1
+            # A failed file is written empty but left out of the content hash and store
+            if "error" not in file_info:
+                file_hashes[file_info["path"]] = file_info["hash"]
+            if file_info.get("blob"):
+                blobs[file_info["hash"]] = file_info.pop("blob")
+            if parsed is None:
+                files_unchanged += 1
+                unchanged_paths.append(file_info["path"])
+            else:
+                changed = file_info["path"] in stored_hashes
+                all_nodes.extend(add_to_batch(batch, file_info, parsed, changed))
+                call_graph.add_file(file_info["path"], parsed["functions"], parsed["imports"])
+                symbols.extend(_symbol_rows(file_info["path"], parsed))
+                if "vectors" in parsed:
+                    vectors.append(parsed["vectors"])
+                pending_files += 1
+            progress(files_parsed=files_parsed)
             
-            for imp in parsed["imports"]:
-                await neo4j.create_import_relationship(repo_id, file_info["path"], imp)
+            if pending_files >= INGEST_FLUSH_FILES:
+                await neo4j.bulk_ingest(repo_id, **batch)
+                batch = new_ingest_batch()
+                pending_files = 0
+                progress(files_written=files_parsed)
+            if len(blobs) >= INGEST_FLUSH_FILES:
+                await content_store.put_blobs(repo_id, blobs)
+                blobs = {}
+        
+        progress(phase="writing")
+        await neo4j.bulk_ingest(repo_id, **batch)
+        await content_store.put_blobs(repo_id, blobs)
+        await content_store.set_files(repo_id, file_hashes)
+        if files_unchanged < len(files) or removed or not embedding_index.has_index(repo_id):
+            await embedding_index.build(repo_id, symbols, vectors, unchanged_paths)
+        progress(files_written=files_parsed)
+        logger.info(f"{files_unchanged} of {len(files)} files unchanged since last analysis")
+        
+        # Calls are resolved once the whole repo is in the graph; nothing to redo if no file changed
+        if files_unchanged < len(files) or removed:
+            progress(phase="linking")
+            await write_call_graph(neo4j, repo_id, call_graph, unchanged_paths, bool(existing_repo_id))
+        
+        if reader is None:
+            commit_sha = await loop.run_in_executor(None, get_head_sha, clone_path)
+        node_count = await neo4j.mark_repo_analyzed(repo_id, commit_sha, get_repo_content_hash(file_hashes))
+        # Chat reads this summary straight off the Repo node instead of rebuilding it per message
+        await neo4j.set_repo_context(repo_id, await build_codebase_context(neo4j, repo_id))
         
-        logger.info(f"Created {len(all_nodes)} nodes for repo {repo_id}")
-        return repo_id, all_nodes
+        logger.info(f"Wrote {len(all_nodes)} nodes for repo {repo_id} ({node_count} total)")
+        return {"repo_id": repo_id, "commit_sha": commit_sha, "node_count": node_count}
         
     finally:
-        if os.path.exists(clone_path):
-            shutil.rmtree(clone_path, onerror=remove_readonly)
+        if reader is not None:
+            reader.close()
+            await loop.run_in_executor(None, mirror_pool.release_mirror, git_dir)
+        else:
+            await loop.run_in_executor(None, release_clone, clone_path)
@@ -0,0 +1,8 @@
+from search.embeddings import EmbeddingIndex, embedding_index, embed_text, embed_symbols
+
+__all__ = [
+    "EmbeddingIndex",
+    "embedding_index",
+    "embed_text",
+    "embed_symbols",
+]
@@ -0,0 +1,229 @@
+import os
+import re
+import json
+import math
+import zlib
+import asyncio
+import logging
+import threading
+from collections import Counter, OrderedDict
+from typing import Optional
+
+import numpy as np
+
+from config import EMBEDDING_DIR, EMBEDDING_DIM, EMBEDDING_BODY_BYTES
+
+logger = logging.getLogger(__name__)
+
+IDENTIFIER = re.compile(r"[A-Za-z_][A-Za-z0-9_]*")
+SUBWORD = re.compile(r"[A-Z]+(?![a-z])|[A-Z]?[a-z]+|[0-9]+")
+
+# Feature weights: what a symbol is called counts for more than what its body mentions
+NAME_WEIGHT = 3.0
+PATH_WEIGHT = 1.0
+BODY_WEIGHT = 1.0
+TRIGRAM_WEIGHT = 0.5
+
+SYMBOL_TYPES = ("Function", "Class")
+# Loaded indexes kept in memory; the matrices themselves are memory-mapped
+LOADED_INDEXES = 8
+
+
+def _terms(text: str) -> list[str]:
+    """Identifiers in text plus their snake_case/camelCase parts, lowercased."""
+    terms = []
+    for identifier in IDENTIFIER.findall(text):
+        lowered = identifier.lower()
+        terms.append(lowered)
+        parts = [part.lower() for part in SUBWORD.findall(identifier)]
+        if len(parts) > 1:
+            terms.extend(part for part in parts if len(part) > 1)
+    return terms
+
+
+def _trigrams(terms: list[str]) -> list[str]:
+    grams = []
+    for term in terms:
+        padded = f"#{term}#"
+        grams.extend("#3" + padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def _add_features(vector: np.ndarray, features: list[str], weight: float):
+    # Signed feature hashing: collisions cancel out on average instead of piling up
+    for feature, count in Counter(features).items():
+        bucket = zlib.crc32(feature.encode())
+        sign = 1.0 if bucket & 0x80000000 else -1.0
+        vector[bucket % len(vector)] += sign * weight * (1.0 + math.log(count))
+
+
+def embed_text(name: str, path: str = "", body: str = "", dim: int = EMBEDDING_DIM) -> np.ndarray:
+    """Hashed bag-of-terms vector for a symbol (or a query, as name), not yet normalized.
+
+    Terms are identifiers split on snake_case and camelCase, so "parseFile" and
+    "parse_file" share features; character trigrams of the name catch near
+    spellings ("parser" vs "parse"). No model and no network: the same text always
+    maps to the same vector.
+    """
+    vector = np.zeros(dim, dtype=np.float32)
+    name_terms = _terms(name)
+    _add_features(vector, name_terms, NAME_WEIGHT)
+    _add_features(vector, _trigrams(name_terms), TRIGRAM_WEIGHT)
+    if path:
+        _add_features(vector, _terms(path.replace("/", " ").replace(".", " ")), PATH_WEIGHT)
+    if body:
+        _add_features(vector, _terms(body), BODY_WEIGHT)
+    return vector
+
+
+def embed_symbols(parsed: dict, path: str, content: bytes) -> np.ndarray:
+    """One vector per function then per class of a parsed file, in parse order.
+
+    Runs in the parse workers, the only place the file content is at hand. The body
+    is read from the symbol's byte range, capped at EMBEDDING_BODY_BYTES.
+    """
+    symbols = parsed["functions"] + parsed["classes"]
+    vectors = np.zeros((len(symbols), EMBEDDING_DIM), dtype=np.float32)
+    for row, symbol in enumerate(symbols):
+        end = min(symbol["end_byte"], symbol["start_byte"] + EMBEDDING_BODY_BYTES)
+        body = content[symbol["start_byte"]:end].decode("utf-8", errors="ignore")
+        vectors[row] = embed_text(symbol["name"], path, body)
+    return vectors
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    return matrix / np.maximum(norms, 1e-12)
+
+
+class EmbeddingIndex:
+    """Per-repo matrix of symbol vectors on disk, memory-mapped for queries.
+
+    Each repo directory holds vectors.npy (one row per function or class, TF-IDF
+    weighted and unit length), idf.npy and symbols.json describing the rows. A
+    query is one matrix-vector product over the mapped rows and an argpartition
+    for the top k, so only the pages of the matrix are touched, never a parse.
+
+    build() writes a repo's index at the end of ingestion; rows of files an
+    incremental run skipped are carried over from the previous index.
+    """
+
+    def __init__(self, root: str):
+        self._root = root
+        self._loaded: OrderedDict[str, tuple[float, np.ndarray, np.ndarray, list, np.ndarray]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _dir(self, repo_id: str) -> str:
+        return os.path.join(self._root, repo_id)
+
+    async def build(self, repo_id: str, symbols: list[dict], vectors: list[np.ndarray], keep_paths: list[str]):
+        """Write the repo's index from the new symbols (rows matching the stacked vectors)
+        plus the previous index's rows for keep_paths."""
+        await asyncio.to_thread(self._build, repo_id, symbols, vectors, keep_paths)
+
+    async def search(self, repo_id: str, query: str, types: Optional[list] = None, limit: int = 50) -> list[dict]:
+        return await asyncio.to_thread(self._search, repo_id, query, types, limit)
+
+    def has_index(self, repo_id: str) -> bool:
+        """Whether the repo has an index an incremental build can carry rows over from."""
+        try:
+            matrix = np.load(os.path.join(self._dir(repo_id), "vectors.npy"), mmap_mode="r")
+        except (OSError, ValueError):
+            return False
+        return matrix.shape[1] == EMBEDDING_DIM
+
+    def _load(self, repo_id: str) -> Optional[tuple]:
+        vectors_path = os.path.join(self._dir(repo_id), "vectors.npy")
+        try:
+            mtime = os.path.getmtime(vectors_path)
+        except OSError:
+            return None
+        with self._lock:
+            loaded = self._loaded.get(repo_id)
+            if loaded is not None and loaded[0] == mtime:
+                self._loaded.move_to_end(repo_id)
+                return loaded
+
+        with open(os.path.join(self._dir(repo_id), "symbols.json")) as f:
+            symbols = json.load(f)
+        idf = np.load(os.path.join(self._dir(repo_id), "idf.npy"))
+        matrix = np.load(vectors_path, mmap_mode="r")
+        type_codes = np.array([SYMBOL_TYPES.index(symbol[0]) for symbol in symbols], dtype=np.int8)
+        loaded = (mtime, matrix, idf, symbols, type_codes)
+        with self._lock:
+            self._loaded[repo_id] = loaded
+            while len(self._loaded) > LOADED_INDEXES:
+                self._loaded.popitem(last=False)
+        return loaded
+
+    def _build(self, repo_id: str, symbols: list[dict], vectors: list[np.ndarray], keep_paths: list[str]):
+        rows = [[s["type"], s["name"], s["file_path"], s["start_line"], s["end_line"]] for s in symbols]
+        raw = np.concatenate(vectors) if vectors else np.zeros((0, EMBEDDING_DIM), dtype=np.float32)
+
+        previous = self._load(repo_id) if keep_paths else None
+        if previous is not None:
+            _, matrix, idf, old_rows, _ = previous
+            keep = set(keep_paths)
+            kept = [index for index, row in enumerate(old_rows) if row[2] in keep]
+            # Stored rows are idf-weighted and normalized; dividing the weights back out
+            # recovers each raw vector up to scale, which cosine similarity ignores
+            raw = np.concatenate([raw, np.asarray(matrix[kept]) / idf])
+            rows += [old_rows[index] for index in kept]
+
+        # Rare terms say more about a symbol than ones every function uses (self, return)
+        document_frequency = np.count_nonzero(raw, axis=0)
+        idf = (np.log((1 + len(rows)) / (1 + document_frequency)) + 1).astype(np.float32)
+        weighted = _normalize(raw * idf).astype(np.float32)
+
+        directory = self._dir(repo_id)
+        os.makedirs(directory, exist_ok=True)
+        # Each file is swapped in whole; vectors.npy goes last since its mtime marks a new index
+        for name, write in (
+            ("symbols.json", lambda f: json.dump(rows, f)),
+            ("idf.npy", lambda f: np.save(f, idf)),
+            ("vectors.npy", lambda f: np.save(f, weighted)),
+        ):
+            temp_path = os.path.join(directory, f".{name}.tmp")
+            with open(temp_path, "w" if name.endswith(".json") else "wb") as f:
+                write(f)
+            os.replace(temp_path, os.path.join(directory, name))
+        logger.info(f"Embedded {len(rows)} symbols for repo {repo_id}")
+
+    def _search(self, repo_id: str, query: str, types: Optional[list], limit: int) -> list[dict]:
+        loaded = self._load(repo_id)
+        if loaded is None:
+            return []
+        _, matrix, idf, symbols, type_codes = loaded
+        if not len(symbols):
+            return []
+
+        query_vector = embed_text(query) * idf
+        norm = np.linalg.norm(query_vector)
+        if norm == 0:
+            return []
+        scores = matrix @ (query_vector / norm)
+        if types:
+            allowed = [SYMBOL_TYPES.index(label) for label in types if label in SYMBOL_TYPES]
+            scores = np.where(np.isin(type_codes, allowed), scores, -np.inf)
+
+        limit = min(limit, len(scores))
+        top = np.argpartition(-scores, limit - 1)[:limit]
+        top = top[np.argsort(-scores[top])]
+
+        results = []
+        for index in top:
+            if not np.isfinite(scores[index]) or scores[index] <= 0:
+                break
+            node_type, name, file_path, start_line, end_line = symbols[index]
+            results.append({
+                "name": name,
+                "type": node_type,
+                "file_path": file_path,
+                "start_line": start_line,
+                "end_line": end_line,
+                "score": round(float(scores[index]), 4),
+            })
+        return results
+
+
+embedding_index = EmbeddingIndex(EMBEDDING_DIR)
@@ -2,9 +2,38 @@
 
 import { useState } from 'react'
 import { useRouter } from 'next/navigation'
-import { analyzeRepository } from '@/lib/api'
+import { analyzeRepository, watchJob, AnalysisJob } from '@/lib/api'
 import AnalysisProgress from '@/components/AnalysisProgress'
 
+const PHASE_LABELS: Record<string, string> = {
+    queued: 'Waiting in queue...',
+    resolving: 'Checking repository...',
+    cloning: 'Cloning repository...',
+    collecting: 'Collecting files...',
+    parsing: 'Parsing files...',
+    writing: 'Building graph...',
+    linking: 'Resolving calls...',
+    completed: 'Complete!',
+}
+
+function jobProgress(job: AnalysisJob) {
+    const step = PHASE_LABELS[job.phase] || 'Analyzing...'
+    if (job.phase === 'completed') {
+        return { step, percent: 100 }
+    }
+    if (job.phase === 'parsing' || job.phase === 'writing') {
+        const total = Math.max(job.files_total, 1)
+        const parsed = job.files_parsed / total
+        const written = job.files_written / total
+        return {
+            step: `${step} (${job.files_parsed}/${job.files_total})`,
+            percent: Math.round(20 + 45 * parsed + 30 * written),
+        }
+    }
+    const percents: Record<string, number> = { queued: 2, resolving: 5, cloning: 10, collecting: 15, linking: 96 }
+    return { step, percent: percents[job.phase] ?? 0 }
+}
+
 export default function AnalyzePage() {
     const router = useRouter()
     const [url, setUrl] = useState('')
@@ -27,22 +56,31 @@ export default function AnalyzePage() {
 
         setError('')
         setIsAnalyzing(true)
-        setProgress({ step: 'Cloning repository...', percent: 10 })
+        setProgress({ step: 'Submitting...', percent: 0 })
 
-        try {
-            setProgress({ step: 'Parsing files...', percent: 30 })
-            const result = await analyzeRepository(url)
-
-            setProgress({ step: 'Building graph...', percent: 70 })
-            await new Promise(resolve => setTimeout(resolve, 500))
-
-            setProgress({ step: 'Complete!', percent: 100 })
-            await new Promise(resolve => setTimeout(resolve, 300))
+        const fail = (message: string) => {
+            setError(message)
+            setIsAnalyzing(false)
+        }
 
-            router.push(`/graph/${result.repo_id}`)
+        try {
+            const { job_id } = await analyzeRepository(url)
+
+            watchJob(
+                job_id,
+                (job) => {
+                    setProgress(jobProgress(job))
+                    if (job.status === 'completed' && job.repo_id) {
+                        const repoId = job.repo_id
+                        setTimeout(() => router.push(`/graph/${repoId}`), 300)
+                    } else if (job.status === 'failed') {
+                        fail(job.error || 'Analysis failed')
+                    }
+                },
+                (err) => fail(err.message)
+            )
         } catch (err) {
-            setError(err instanceof Error ? err.message : 'Analysis failed')
-            setIsAnalyzing(false)
+            fail(err instanceof Error ? err.message : 'Analysis failed')
         }
     }
 
@@ -1,8 +1,8 @@
 'use client'
 
-import { useEffect, useState } from 'react'
+import { useCallback, useEffect, useState } from 'react'
 import { useParams } from 'next/navigation'
-import { getGraph, explainCode } from '@/lib/api'
+import { getGraphLevel, getFileGraph, streamExplanation, getCode, GraphPage } from '@/lib/api'
 import { GraphNode, GraphEdge } from '@/lib/types'
 import GraphViewer from '@/components/GraphViewer'
 import ChatPanel from '@/components/ChatPanel'
@@ -19,14 +19,38 @@ export default function GraphPage() {
     const [error, setError] = useState('')
     const [selectedNode, setSelectedNode] = useState<any>(null)
     const [explanation, setExplanation] = useState('')
+    const [code, setCode] = useState('')
     const [showChat, setShowChat] = useState(true)
+    const [expanded, setExpanded] = useState<Set<string>>(new Set())
+    const [pending, setPending] = useState<Record<string, { type: string; cursor: string }>>({})
+
+    const mergePage = useCallback((key: string, type: string, page: GraphPage) => {
+        setNodes(prev => {
+            const seen = new Set(prev.map(node => node.id))
+            return [...prev, ...page.nodes.filter(node => !seen.has(node.id))]
+        })
+        setEdges(prev => {
+            const seen = new Set(prev.map(edge => edge.id))
+            return [...prev, ...page.edges.filter(edge => !seen.has(edge.id))]
+        })
+        setPending(prev => {
+            const next = { ...prev }
+            if (page.next_cursor) {
+                next[key] = { type, cursor: page.next_cursor }
+            } else {
+                delete next[key]
+            }
+            return next
+        })
+    }, [])
 
     useEffect(() => {
         async function loadGraph() {
             try {
-                const data = await getGraph(repoId)
+                const data = await getGraphLevel(repoId)
                 setNodes(data.nodes)
                 setEdges(data.edges)
+                setPending(data.next_cursor ? { '': { type: 'directory', cursor: data.next_cursor } } : {})
             } catch (err) {
                 setError('Failed to load graph data')
             } finally {
@@ -37,18 +61,56 @@ export default function GraphPage() {
         loadGraph()
     }, [repoId])
 
+    const expandNode = async (path: string, type: string, cursor?: string) => {
+        const page = type === 'file'
+            ? await getFileGraph(repoId, path, cursor)
+            : await getGraphLevel(repoId, path, cursor)
+        mergePage(path, type, page)
+        setExpanded(prev => new Set(prev).add(path))
+    }
+
+    const loadMore = async () => {
+        const entries = Object.entries(pending)
+        if (entries.length === 0) return
+        const [path, { type, cursor }] = entries[0]
+        try {
+            await expandNode(path, type, cursor)
+        } catch (err) {
+            setError('Failed to load graph data')
+        }
+    }
+
     const handleNodeClick = async (nodeId: string, nodeData: any) => {
+        const type = nodes.find(node => node.id === nodeId)?.type
+        if (type === 'directory' || type === 'file') {
+            if (!expanded.has(nodeId)) {
+                try {
+                    await expandNode(nodeId, type)
+                } catch (err) {
+                    setError('Failed to load graph data')
+                }
+            }
+            if (type === 'directory') return
+        }
+
         setSelectedNode({ id: nodeId, ...nodeData })
 
         try {
-            const result = await explainCode(repoId, nodeId)
-            setExplanation(result.explanation)
+            setExplanation('')
+            setCode('')
+            await streamExplanation(repoId, nodeId, (event) => {
+                if (event.type === 'code') {
+                    setCode(event.code)
+                } else if (event.type === 'token') {
+                    setExplanation((prev) => prev + event.text)
+                }
+            })
         } catch (err) {
             setExplanation('Unable to generate explanation')
         }
     }
 
-    const handleSearchResult = (result: any) => {
+    const handleSearchResult = async (result: any) => {
         setSelectedNode({
             id: result.name,
             label: result.name,
@@ -56,6 +118,16 @@ export default function GraphPage() {
             startLine: result.start_line,
             endLine: result.end_line,
         })
+        setExplanation('')
+        setCode('')
+
+        if (!result.file_path) return
+        try {
+            const data = await getCode(repoId, result.file_path, result.start_line, result.end_line)
+            setCode(data.code)
+        } catch (err) {
+            setCode(`[Code for ${result.name}]`)
+        }
     }
 
     if (isLoading) {
@@ -88,6 +160,14 @@ export default function GraphPage() {
                         <span className="rounded-full bg-gray-800 px-2 py-1 text-xs text-gray-400">
                             {nodes.length} nodes
                         </span>
+                        {Object.keys(pending).length > 0 && (
+                            <button
+                                onClick={loadMore}
+                                className="rounded-lg bg-gray-800 px-3 py-1.5 text-sm text-gray-400 transition-colors hover:text-white"
+                            >
+                                Load more
+                            </button>
+                        )}
                     </div>
                     <div className="flex items-center space-x-4">
                         <SearchBar repoId={repoId} onResultClick={handleSearchResult} />
@@ -112,7 +192,7 @@ export default function GraphPage() {
                         <div className="w-1/3 border-l border-gray-800">
                             <CodePreview
                                 fileName={selectedNode.fullPath || selectedNode.label}
-                                code={`[Code for ${selectedNode.label}]`}
+                                code={code}
                                 startLine={selectedNode.startLine}
                                 endLine={selectedNode.endLine}
                                 explanation={explanation}
@@ -1,7 +1,7 @@
 'use client'
 
 import { useState, useRef, useEffect } from 'react'
-import { chatWithCodebase } from '@/lib/api'
+import { streamChat } from '@/lib/api'
 
 interface Message {
     id: string
@@ -57,30 +57,32 @@ export default function ChatPanel({ repoId, onReferenceClick }: ChatPanelProps)
         setInput('')
         setIsLoading(true)
 
+        const assistantId = (Date.now() + 1).toString()
+        const updateAssistant = (update: (message: Message) => Message) => {
+            setMessages((prev) => prev.map((message) => (message.id === assistantId ? update(message) : message)))
+        }
+
+        setMessages((prev) => {
+            const newMessages = [...prev, { id: assistantId, role: 'assistant' as const, content: '', references: [] }]
+            return newMessages.slice(-50)
+        })
+
         try {
-            const response = await chatWithCodebase(repoId, input)
-
-            const assistantMessage: Message = {
-                id: (Date.now() + 1).toString(),
-                role: 'assistant',
-                content: response.response,
-                references: response.references,
-            }
-
-            setMessages((prev) => {
-                const newMessages = [...prev, assistantMessage]
-                return newMessages.slice(-50)
+            await streamChat(repoId, input, (event) => {
+                if (event.type === 'token') {
+                    updateAssistant((message) => ({ ...message, content: message.content + event.text }))
+                } else if (event.type === 'reference') {
+                    updateAssistant((message) => ({
+                        ...message,
+                        references: [...(message.references || []), event.reference],
+                    }))
+                }
             })
         } catch (error) {
-            const errorMessage: Message = {
-                id: (Date.now() + 1).toString(),
-                role: 'assistant',
+            updateAssistant((message) => ({
+                ...message,
                 content: `Sorry, I encountered an error: ${error instanceof Error ? error.message : 'Please try again.'}`,
-            }
-            setMessages((prev) => {
-                const newMessages = [...prev, errorMessage]
-                return newMessages.slice(-50)
-            })
+            }))
         } finally {
             setIsLoading(false)
         }
@@ -94,7 +96,7 @@ export default function ChatPanel({ repoId, onReferenceClick }: ChatPanelProps)
             </div>
 
             <div className="flex-1 overflow-y-auto p-4 space-y-4">
-                {messages.map((message) => (
+                {messages.filter((message) => message.content).map((message) => (
                     <div
                         key={message.id}
                         className={`flex ${message.role === 'user' ? 'justify-end' : 'justify-start'}`}
@@ -124,7 +126,7 @@ export default function ChatPanel({ repoId, onReferenceClick }: ChatPanelProps)
                     </div>
                 ))}
 
-                {isLoading && (
+                {isLoading && !messages[messages.length - 1]?.content && (
                     <div className="flex justify-start">
                         <div className="rounded-lg bg-gray-800 px-4 py-3">
                             <div className="flex space-x-2">
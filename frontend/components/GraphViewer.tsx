@@ -32,6 +32,7 @@ interface GraphViewerProps {
 
 const NODE_COLORS: Record<string, string> = {
     repo: '#6366f1',
+    directory: '#0ea5e9',
     file: '#22c55e',
     function: '#eab308',
     class: '#ef4444',
@@ -49,18 +50,18 @@ function layoutNodes(nodes: any[]): any[] {
         nodesByType[type].push(node)
     })
 
-    const typeOrder = ['repo', 'file', 'class', 'function', 'module']
+    const typeOrder = ['repo', 'directory', 'file', 'class', 'function', 'module']
     let yOffset = 0
     const layoutedNodes: any[] = []
 
     typeOrder.forEach(type => {
         const typeNodes = nodesByType[type] || []
-        const nodesPerRow = type === 'repo' ? 1 : type === 'file' ? 4 : 6
+        const nodesPerRow = type === 'repo' ? 1 : type === 'file' || type === 'directory' ? 4 : 6
 
         typeNodes.forEach((node, index) => {
             const row = Math.floor(index / nodesPerRow)
             const col = index % nodesPerRow
-            const xSpacing = type === 'file' ? 250 : 180
+            const xSpacing = type === 'file' || type === 'directory' ? 250 : 180
             const centerOffset = typeof window !== 'undefined' ? window.innerWidth / 2 - 400 : 400
             const xOffset = -(nodesPerRow * xSpacing) / 2 + col * xSpacing
 
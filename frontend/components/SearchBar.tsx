@@ -13,8 +13,11 @@ export default function SearchBar({ repoId, onResultClick }: SearchBarProps) {
     const [results, setResults] = useState<SearchResult[]>([])
     const [isSearching, setIsSearching] = useState(false)
     const [showResults, setShowResults] = useState(false)
+    const [types, setTypes] = useState('')
+    const [semantic, setSemantic] = useState(false)
     const searchRef = useRef<HTMLDivElement>(null)
     const debounceTimer = useRef<NodeJS.Timeout | null>(null);
+    const latestRequest = useRef(0)
 
     useEffect(() => {
         const handleClickOutside = (event: MouseEvent) => {
@@ -32,7 +35,9 @@ export default function SearchBar({ repoId, onResultClick }: SearchBarProps) {
         }
     }, [])
 
-    const performSearch = useCallback(async (value: string) => {
+    const performSearch = useCallback(async (value: string, typeFilter: string, semanticMode: boolean) => {
+        const request = ++latestRequest.current
+
         if (value.length < 2) {
             setResults([])
             setShowResults(false)
@@ -43,12 +48,19 @@ export default function SearchBar({ repoId, onResultClick }: SearchBarProps) {
         setShowResults(true)
 
         try {
-            const response = await searchCodebase(repoId, value)
-            setResults(response.results)
+            const response = await searchCodebase(repoId, value, typeFilter, semanticMode ? 'semantic' : 'text')
+            // Ignore responses that arrive after a newer search was started
+            if (request === latestRequest.current) {
+                setResults(response.results)
+            }
         } catch (error) {
-            setResults([])
+            if (request === latestRequest.current) {
+                setResults([])
+            }
         } finally {
-            setIsSearching(false)
+            if (request === latestRequest.current) {
+                setIsSearching(false)
+            }
         }
     }, [repoId])
 
@@ -60,10 +72,20 @@ export default function SearchBar({ repoId, onResultClick }: SearchBarProps) {
         }
 
         debounceTimer.current = setTimeout(() => {
-            performSearch(value)
+            performSearch(value, types, semantic)
         }, 300)
     }
 
+    const handleTypesChange = (value: string) => {
+        setTypes(value)
+        performSearch(query, value, semantic)
+    }
+
+    const handleModeChange = (value: boolean) => {
+        setSemantic(value)
+        performSearch(query, types, value)
+    }
+
     const handleResultClick = (result: SearchResult) => {
         onResultClick?.(result)
         setShowResults(false)
@@ -71,7 +93,27 @@ export default function SearchBar({ repoId, onResultClick }: SearchBarProps) {
     }
 
     return (
-        <div ref={searchRef} className="relative">
+        <div ref={searchRef} className="relative flex items-center space-x-2">
+            <select
+                value={types}
+                onChange={(e) => handleTypesChange(e.target.value)}
+                className="rounded-lg border border-gray-700 bg-gray-900 px-2 py-2 text-sm text-gray-400 focus:border-primary-500 focus:outline-none"
+            >
+                <option value="">All</option>
+                <option value="function">Functions</option>
+                <option value="class">Classes</option>
+                <option value="file">Files</option>
+                <option value="module">Modules</option>
+            </select>
+            <label className="flex items-center space-x-1 text-sm text-gray-400" title="Match by meaning instead of by name">
+                <input
+                    type="checkbox"
+                    checked={semantic}
+                    onChange={(e) => handleModeChange(e.target.checked)}
+                    className="accent-primary-500"
+                />
+                <span>Semantic</span>
+            </label>
             <input
                 type="text"
                 value={query}
@@ -82,7 +124,7 @@ export default function SearchBar({ repoId, onResultClick }: SearchBarProps) {
             />
 
             {showResults && (
-                <div className="absolute top-full left-0 z-50 mt-2 w-80 overflow-hidden rounded-lg border border-gray-700 bg-gray-900 shadow-xl">
+                <div className="absolute top-full right-0 z-50 mt-2 w-80 overflow-hidden rounded-lg border border-gray-700 bg-gray-900 shadow-xl">
                     {isSearching ? (
                         <div className="px-4 py-3 text-sm text-gray-400">Searching...</div>
                     ) : results.length === 0 ? (
@@ -1,9 +1,24 @@
 const API_URL = process.env.NEXT_PUBLIC_API_URL || 'http://localhost:8000'
 
 export interface AnalyzeResult {
-    repo_id: string
+    job_id: string
     status: string
+}
+
+export interface AnalysisJob {
+    job_id: string
+    github_url: string
+    status: 'queued' | 'running' | 'completed' | 'failed'
+    phase: string
+    files_total: number
+    files_parsed: number
+    files_written: number
+    repo_id: string | null
     node_count: number
+    cache_hit: boolean
+    error: string | null
+    created_at: string
+    finished_at: string | null
 }
 
 export interface GraphNode {
@@ -13,6 +28,9 @@ export interface GraphNode {
         fullPath?: string
         startLine?: number
         endLine?: number
+        fileCount?: number
+        functionCount?: number
+        classCount?: number
     }
     type: string
     style?: Record<string, string>
@@ -31,6 +49,10 @@ export interface GraphData {
     edges: GraphEdge[]
 }
 
+export interface GraphPage extends GraphData {
+    next_cursor: string | null
+}
+
 export interface ChatResponse {
     response: string
     references: Array<{
@@ -46,6 +68,7 @@ export interface SearchResult {
     file_path?: string
     start_line?: number
     end_line?: number
+    score?: number
 }
 
 export async function analyzeRepository(githubUrl: string): Promise<AnalyzeResult> {
@@ -72,6 +95,49 @@ export async function analyzeRepository(githubUrl: string): Promise<AnalyzeResul
     return response.json()
 }
 
+export async function getJob(jobId: string): Promise<AnalysisJob> {
+    const response = await fetch(`${API_URL}/jobs/${jobId}`)
+
+    if (!response.ok) {
+        let errorMsg = 'Failed to fetch analysis status'
+        try {
+            const error = await response.json()
+            errorMsg = error.detail || errorMsg
+        } catch {
+            const text = await response.text()
+            errorMsg = text || errorMsg
+        }
+        throw new Error(errorMsg)
+    }
+
+    return response.json()
+}
+
+export function watchJob(
+    jobId: string,
+    onUpdate: (job: AnalysisJob) => void,
+    onError: (error: Error) => void
+): () => void {
+    const source = new EventSource(`${API_URL}/jobs/${jobId}/events`)
+
+    source.onmessage = (event) => {
+        const job: AnalysisJob = JSON.parse(event.data)
+        onUpdate(job)
+        if (job.status === 'completed' || job.status === 'failed') {
+            source.close()
+        }
+    }
+
+    source.onerror = () => {
+        // EventSource reconnects by itself; only a stream it gave up on (e.g. unknown job) is fatal
+        if (source.readyState === EventSource.CLOSED) {
+            getJob(jobId).then(onUpdate).catch(onError)
+        }
+    }
+
+    return () => source.close()
+}
+
 export async function getGraph(repoId: string): Promise<GraphData> {
     const response = await fetch(`${API_URL}/graph/${repoId}`)
 
@@ -90,6 +156,38 @@ export async function getGraph(repoId: string): Promise<GraphData> {
     return response.json()
 }
 
+async function fetchGraphPage(url: string): Promise<GraphPage> {
+    const response = await fetch(url)
+
+    if (!response.ok) {
+        let errorMsg = 'Failed to fetch graph data'
+        try {
+            const error = await response.json()
+            errorMsg = error.detail || errorMsg
+        } catch {
+            const text = await response.text()
+            errorMsg = text || errorMsg
+        }
+        throw new Error(errorMsg)
+    }
+
+    return response.json()
+}
+
+export async function getGraphLevel(repoId: string, path = '', cursor?: string | null, maxNodes?: number): Promise<GraphPage> {
+    const params = new URLSearchParams({ path })
+    if (cursor) params.set('cursor', cursor)
+    if (maxNodes) params.set('max_nodes', String(maxNodes))
+    return fetchGraphPage(`${API_URL}/graph/${repoId}/level?${params}`)
+}
+
+export async function getFileGraph(repoId: string, path: string, cursor?: string | null, maxNodes?: number): Promise<GraphPage> {
+    const params = new URLSearchParams({ path })
+    if (cursor) params.set('cursor', cursor)
+    if (maxNodes) params.set('max_nodes', String(maxNodes))
+    return fetchGraphPage(`${API_URL}/graph/${repoId}/file?${params}`)
+}
+
 export async function chatWithCodebase(repoId: string, message: string): Promise<ChatResponse> {
     const response = await fetch(`${API_URL}/chat`, {
         method: 'POST',
@@ -114,6 +212,72 @@ export async function chatWithCodebase(repoId: string, message: string): Promise
     return response.json()
 }
 
+export type Reference = ChatResponse['references'][number]
+
+export type StreamEvent =
+    | { type: 'token'; text: string }
+    | { type: 'reference'; reference: Reference }
+    | { type: 'code'; code: string }
+    | { type: 'done'; references?: Reference[] }
+    | { type: 'error'; detail: string }
+
+// Reads a text/event-stream response body, calling onEvent for every `data:` line.
+// fetch is used rather than EventSource, which can't POST and reconnects (re-running
+// the generation) whenever the server ends the stream.
+async function readEventStream(response: Response, onEvent: (event: StreamEvent) => void): Promise<void> {
+    if (!response.ok || !response.body) {
+        let errorMsg = 'Failed to get response'
+        try {
+            const error = await response.json()
+            errorMsg = error.detail || errorMsg
+        } catch {
+            // keep the default message
+        }
+        throw new Error(errorMsg)
+    }
+
+    const reader = response.body.getReader()
+    const decoder = new TextDecoder()
+    let buffer = ''
+
+    while (true) {
+        const { done, value } = await reader.read()
+        if (done) break
+        buffer += decoder.decode(value, { stream: true })
+
+        const frames = buffer.split('\n\n')
+        buffer = frames.pop() || ''
+        for (const frame of frames) {
+            const data = frame
+                .split('\n')
+                .filter((line) => line.startsWith('data:'))
+                .map((line) => line.slice(5).trimStart())
+                .join('\n')
+            if (!data) continue
+            const event: StreamEvent = JSON.parse(data)
+            if (event.type === 'error') throw new Error(event.detail)
+            onEvent(event)
+        }
+    }
+}
+
+export async function streamChat(repoId: string, message: string, onEvent: (event: StreamEvent) => void): Promise<void> {
+    const response = await fetch(`${API_URL}/chat/stream`, {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+        },
+        body: JSON.stringify({ repo_id: repoId, message }),
+    })
+    await readEventStream(response, onEvent)
+}
+
+export async function streamExplanation(repoId: string, nodeId: string, onEvent: (event: StreamEvent) => void): Promise<void> {
+    const params = new URLSearchParams({ repo_id: repoId, node_id: nodeId })
+    const response = await fetch(`${API_URL}/explain/stream?${params}`)
+    await readEventStream(response, onEvent)
+}
+
 export async function explainCode(repoId: string, nodeId: string): Promise<{ explanation: string; code: string }> {
     const response = await fetch(`${API_URL}/explain?repo_id=${repoId}&node_id=${nodeId}`)
 
@@ -132,8 +296,32 @@ export async function explainCode(repoId: string, nodeId: string): Promise<{ exp
     return response.json()
 }
 
-export async function searchCodebase(repoId: string, query: string): Promise<{ results: SearchResult[] }> {
-    const response = await fetch(`${API_URL}/search?repo_id=${repoId}&query=${encodeURIComponent(query)}`)
+export async function getCode(repoId: string, path: string, startLine?: number, endLine?: number): Promise<{ path: string; start_line: number; code: string }> {
+    const params = new URLSearchParams({ repo_id: repoId, path })
+    if (startLine) params.set('start_line', String(startLine))
+    if (endLine) params.set('end_line', String(endLine))
+    const response = await fetch(`${API_URL}/code?${params}`)
+
+    if (!response.ok) {
+        let errorMsg = 'Failed to load code'
+        try {
+            const error = await response.json()
+            errorMsg = error.detail || errorMsg
+        } catch {
+            const text = await response.text()
+            errorMsg = text || errorMsg
+        }
+        throw new Error(errorMsg)
+    }
+
+    return response.json()
+}
+
+export async function searchCodebase(repoId: string, query: string, types?: string, mode?: 'text' | 'semantic'): Promise<{ results: SearchResult[] }> {
+    const params = new URLSearchParams({ repo_id: repoId, query })
+    if (types) params.set('types', types)
+    if (mode) params.set('mode', mode)
+    const response = await fetch(`${API_URL}/search?${params}`)
 
     if (!response.ok) {
         let errorMsg = 'Failed to search'
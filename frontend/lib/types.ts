@@ -5,6 +5,9 @@ export interface GraphNode {
         fullPath?: string
         startLine?: number
         endLine?: number
+        fileCount?: number
+        functionCount?: number
+        classCount?: number
     }
     type: string
     style?: Record<string, string>